@@ -0,0 +1,113 @@
+# vectorized versions of the evaluation functions in evaluation.py.
+# each takes an (N, 14) array of boards and the player to score for (one int,
+# or an array of N, e.g. the side to move of each board) and returns N scores,
+# equal to calling the scalar function on every board.
+import numpy as np
+
+from game_engine import P1, P2, P1_pits, P2_pits, P1_store, P2_store
+from evaluation import EVAL_FUNCTIONS, WEIGHTED_DEFAULTS, POSITIONAL_DEFAULTS
+
+# column views used below, all in the same pit order as the scalar loops
+_P1_PITS = np.array(P1_pits)
+_P2_PITS = np.array(P2_pits)
+_P1_OPPOSITE = 12 - _P1_PITS
+_P2_OPPOSITE = 12 - _P2_PITS
+# stones needed in each pit to land exactly in the own store
+_STORE_DISTANCE = np.array([6, 5, 4, 3, 2, 1])
+
+
+def _as_boards(boards):
+    boards = np.asarray(boards, dtype=np.int64)
+    if boards.ndim != 2 or boards.shape[1] != 14:
+        raise ValueError(f"expected an (N, 14) array of boards, got shape {boards.shape}")
+    return boards
+
+
+def _is_p1(boards, max_player):
+    return np.broadcast_to(np.asarray(max_player) == P1, (boards.shape[0],))
+
+
+def _score_diff(boards, is_p1):
+    diff = boards[:, P1_store] - boards[:, P2_store]
+    return np.where(is_p1, diff, -diff)
+
+
+def _capture_potential(boards, is_p1):
+    p1 = ((boards[:, _P1_PITS] == 0) * boards[:, _P1_OPPOSITE]).sum(axis=1)
+    p2 = ((boards[:, _P2_PITS] == 0) * boards[:, _P2_OPPOSITE]).sum(axis=1)
+    return np.where(is_p1, p1, p2)
+
+
+def evaluate_score_difference_batch(boards, max_player):
+    boards = _as_boards(boards)
+    return _score_diff(boards, _is_p1(boards, max_player))
+
+
+def eval_weighted_batch(boards, max_player, weights=WEIGHTED_DEFAULTS):
+    boards = _as_boards(boards)
+    is_p1 = _is_p1(boards, max_player)
+
+    score_diff = _score_diff(boards, is_p1)
+    side_diff = boards[:, _P1_PITS].sum(axis=1) - boards[:, _P2_PITS].sum(axis=1)
+    stone_diff = np.where(is_p1, side_diff, -side_diff)
+    capture_potential = _capture_potential(boards, is_p1)
+
+    p1_extra = (boards[:, _P1_PITS] == _STORE_DISTANCE).sum(axis=1)
+    p2_extra = (boards[:, _P2_PITS] == _STORE_DISTANCE).sum(axis=1)
+    extra_turn_potential = np.where(is_p1, p1_extra, p2_extra)
+
+    w1 = weights["score_diff"]
+    w2 = weights["stone_diff"]
+    w3 = weights["capture"]
+    w4 = weights["extra_turn"]
+
+    return (w1 * score_diff + w2 * stone_diff + w3 * capture_potential + w4 * extra_turn_potential)
+
+
+def _positional(boards, pits, gradient):
+    # summed pit by pit like the scalar loop, so the float result is bit-identical
+    total = np.zeros(boards.shape[0])
+    for idx, pit in enumerate(pits):
+        weight = 1.0 + idx * gradient
+        total = total + boards[:, pit] * weight
+    return total
+
+
+def eval_positional_batch(boards, max_player, weights=POSITIONAL_DEFAULTS):
+    boards = _as_boards(boards)
+    is_p1 = _is_p1(boards, max_player)
+
+    score_diff = _score_diff(boards, is_p1)
+
+    total_stones = boards.sum(axis=1)
+    stones_in_stores = boards[:, P1_store] + boards[:, P2_store]
+    late_game = stones_in_stores > total_stones * 0.7
+
+    p1_positional = _positional(boards, P1_pits, weights["gradient"])
+    p2_positional = _positional(boards, P2_pits, weights["gradient"])
+    positional_diff = np.where(is_p1, p1_positional - p2_positional,
+                               p2_positional - p1_positional)
+    capture_potential = _capture_potential(boards, is_p1)
+
+    score = (weights["score_diff"] * score_diff + weights["positional"] * positional_diff
+             + weights["capture"] * capture_potential)
+    return np.where(late_game, score_diff * 10, score)
+
+
+BATCH_EVAL_FUNCTIONS = {
+    "simple": evaluate_score_difference_batch,
+    "weighted": eval_weighted_batch,
+    "positional": eval_positional_batch,
+}
+
+
+# batched version of any evaluator in EVAL_FUNCTIONS, including the ones loaded
+# from a weights config. the weights come from the scalar evaluator registered
+# under the name, so both always score the same
+def batch_eval_function(name):
+    fn = EVAL_FUNCTIONS[name]
+    if not hasattr(fn, "base"):
+        return BATCH_EVAL_FUNCTIONS[name]
+    weights = fn.weights
+    batch_fn = BATCH_EVAL_FUNCTIONS[fn.base]
+    return lambda boards, max_player: batch_fn(boards, max_player, weights)
@@ -1,14 +1,19 @@
 import argparse
+import os
 import time
 import sys
 import random
+import shlex
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
 from typing import Tuple
 
 from game_engine import (
     GameState, initial_state, player, actions, result,
     terminal_test, score, P1, P2, P1_store, P2_store
 )
-from minmax_pruning import AlphaBetaPlayer
+from minmax_pruning import AlphaBetaPlayer, ORDERINGS, ALGORITHMS
+from search_stats import JsonLinesSink
 
 
 class RandomPlayer:
@@ -35,64 +40,101 @@ class GreedyPlayer:
         return best_action
 
 
-def play_game(ai1, ai2) -> Tuple[int, int, int]:
+# opening_plies: the first moves are played at random (from the global RNG), so two
+# deterministic players do not play the same game every time.
+# on_move(state, action, mover) is called before every move, mover is None for
+# the random opening moves
+def play_game(ai1, ai2, opening_plies: int = 0, on_move=None) -> Tuple[int, int, int]:
     state = initial_state()
     moves = 0
     while not terminal_test(state):
         cp = player(state)
-        if cp == P1:
-            action = ai1.choose_action(state)
+        mover = None
+        if moves < opening_plies:
+            action = random.choice(actions(state))
         else:
-            action = ai2.choose_action(state)
+            mover = ai1 if cp == P1 else ai2
+            action = mover.choose_action(state)
+        if on_move is not None:
+            on_move(state, action, mover)
         state = result(state, action)
         moves += 1
     return state.board[P1_store], state.board[P2_store], moves
 
 
-def run_matchup(ai1_factory, ai2_factory, num_games: int, label: str = "") -> dict:
+# one game of a matchup. the global RNG is seeded per game, so RandomPlayer plays
+# the same moves no matter which process runs the game or in what order.
+# returns (ai1 score, ai2 score, moves)
+def play_matchup_game(ai1_factory, ai2_factory, swapped, seed, opening_plies=0):
+    random.seed(seed)
+    # swap sides to reduce first-player bias
+    ai1 = ai1_factory(P2 if swapped else P1)
+    ai2 = ai2_factory(P1 if swapped else P2)
+    try:
+        if not swapped:
+            return play_game(ai1, ai2, opening_plies)
+        s1, s2, moves = play_game(ai2, ai1, opening_plies)
+        return s2, s1, moves
+    finally:
+        # players holding a process, a connection or a cache file
+        for ai in (ai1, ai2):
+            if hasattr(ai, "close"):
+                ai.close()
+
+
+# a factory whose players log to a JsonLinesSink, with extra fields on every record
+def tag_stats(factory, **context):
+    sink = getattr(factory, "keywords", {}).get("on_stats")
+    if isinstance(sink, JsonLinesSink):
+        return partial(factory, on_stats=sink.with_context(**context))
+    return factory
+
+
+# factories must be picklable (classes or functools.partial, not lambdas) when jobs > 1
+def run_matchup(ai1_factory, ai2_factory, num_games: int, label: str = "",
+                jobs: int = 1, seed: int = 0, opening_plies: int = 0) -> dict:
     print(f"\n  {label}")
     print(f"  {'-' * len(label)}")
 
+    total_games = num_games * 2
+    # game 2i has ai1 as P1, game 2i+1 is the same pairing with sides swapped.
+    # both games of a pair share a seed, so they start from the same random opening
+    games = [(tag_stats(ai1_factory, matchup=label, ai=1, game=g),
+              tag_stats(ai2_factory, matchup=label, ai=2, game=g),
+              g % 2 == 1, f"{seed}-{label}-{g // 2}", opening_plies)
+             for g in range(total_games)]
+    results_list = [None] * total_games
+    start = time.time()
+
+    if jobs <= 1:
+        for g, game in enumerate(games):
+            results_list[g] = play_matchup_game(*game)
+            if g % 2 == 1:
+                sys.stdout.write(f"\r  Games played: {g + 1}/{total_games}")
+                sys.stdout.flush()
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(play_matchup_game, *game): g for g, game in enumerate(games)}
+            for done, future in enumerate(as_completed(futures), 1):
+                results_list[futures[future]] = future.result()
+                sys.stdout.write(f"\r  Games played: {done}/{total_games}")
+                sys.stdout.flush()
+
+    # aggregate in game order so the stats do not depend on the number of jobs
     ai1_wins = 0
     ai2_wins = 0
     draws = 0
     total_moves = 0
-    results_list = []
-    start = time.time()
-
-    for i in range(num_games):
-        ai1 = ai1_factory(P1)
-        ai2 = ai2_factory(P2)
-        s1, s2, moves = play_game(ai1, ai2)
+    for s1, s2, moves in results_list:
         total_moves += moves
-
         if s1 > s2:
             ai1_wins += 1
         elif s2 > s1:
             ai2_wins += 1
         else:
             draws += 1
-        results_list.append((s1, s2))
-
-        # swap sides to reduce first-player bias
-        ai1 = ai1_factory(P2)
-        ai2 = ai2_factory(P1)
-        s1, s2, moves = play_game(ai2, ai1)
-        total_moves += moves
-
-        if s2 > s1:
-            ai1_wins += 1
-        elif s1 > s2:
-            ai2_wins += 1
-        else:
-            draws += 1
-        results_list.append((s2, s1))
-
-        sys.stdout.write(f"\r  Games played: {(i+1)*2}/{num_games*2}")
-        sys.stdout.flush()
 
     elapsed = time.time() - start
-    total_games = num_games * 2
     avg_s1 = sum(r[0] for r in results_list) / len(results_list)
     avg_s2 = sum(r[1] for r in results_list) / len(results_list)
 
@@ -120,47 +162,227 @@ def run_matchup(ai1_factory, ai2_factory, num_games: int, label: str = "") -> di
     return stats
 
 
-def benchmark_eval_functions(num_games: int = 25):
+def benchmark_eval_functions(num_games: int = 25, jobs: int = 1, seed: int = 0,
+                             search_options: dict = None):
     print("\n" + "=" * 55)
     print("  Evaluation Function Comparison (depth 6)")
     print("=" * 55)
 
     depth = 6
     evals = ["simple", "weighted", "positional"]
+    search_options = search_options or {}
 
     for i, ev1 in enumerate(evals):
         for ev2 in evals[i+1:]:
-            f1 = lambda pid, e=ev1: AlphaBetaPlayer(pid, max_depth=depth, eval_func=e)
-            f2 = lambda pid, e=ev2: AlphaBetaPlayer(pid, max_depth=depth, eval_func=e)
-            run_matchup(f1, f2, num_games, f"{ev1} vs {ev2}")
+            f1 = partial(AlphaBetaPlayer, max_depth=depth, eval_func=ev1, **search_options)
+            f2 = partial(AlphaBetaPlayer, max_depth=depth, eval_func=ev2, **search_options)
+            run_matchup(f1, f2, num_games, f"{ev1} vs {ev2}", jobs, seed)
 
 
-def benchmark_search_depths(num_games: int = 25):
+def benchmark_search_depths(num_games: int = 25, jobs: int = 1, seed: int = 0,
+                            search_options: dict = None):
     print("\n" + "=" * 55)
     print("  Search Depth Comparison (weighted eval)")
     print("=" * 55)
 
     depths = [2, 4, 6, 8]
+    search_options = search_options or {}
 
     for i, d1 in enumerate(depths):
         for d2 in depths[i+1:]:
-            f1 = lambda pid, d=d1: AlphaBetaPlayer(pid, max_depth=d, eval_func="weighted")
-            f2 = lambda pid, d=d2: AlphaBetaPlayer(pid, max_depth=d, eval_func="weighted")
-            run_matchup(f1, f2, num_games, f"Depth {d1} vs Depth {d2}")
+            f1 = partial(AlphaBetaPlayer, max_depth=d1, eval_func="weighted", **search_options)
+            f2 = partial(AlphaBetaPlayer, max_depth=d2, eval_func="weighted", **search_options)
+            run_matchup(f1, f2, num_games, f"Depth {d1} vs Depth {d2}", jobs, seed)
 
 
-def benchmark_against_baselines(num_games: int = 25):
+def benchmark_against_baselines(num_games: int = 25, jobs: int = 1, seed: int = 0,
+                                search_options: dict = None):
     print("\n" + "=" * 55)
     print("  AI vs Baselines")
     print("=" * 55)
 
-    ai = lambda pid: AlphaBetaPlayer(pid, max_depth=6, eval_func="weighted")
-    rnd = lambda pid: RandomPlayer(pid)
-    greedy = lambda pid: GreedyPlayer(pid)
+    ai = partial(AlphaBetaPlayer, max_depth=6, eval_func="weighted", **(search_options or {}))
+    rnd = RandomPlayer
+    greedy = GreedyPlayer
+
+    run_matchup(ai, rnd, num_games, "AlphaBeta(d=6, weighted) vs Random", jobs, seed)
+    run_matchup(ai, greedy, num_games, "AlphaBeta(d=6, weighted) vs Greedy", jobs, seed)
+    run_matchup(greedy, rnd, num_games, "Greedy vs Random", jobs, seed)
+
+
+# positions from seeded random games, every 5th position of each game, so every
+# search variant is measured on exactly the same boards
+def fixed_positions(num_positions: int = 40, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < num_positions:
+        state = initial_state()
+        ply = 0
+        while not terminal_test(state) and len(positions) < num_positions:
+            if ply % 5 == 0:
+                positions.append(state)
+            state = result(state, rng.choice(actions(state)))
+            ply += 1
+    return positions
+
+
+# searches every position with one player per side, in order, like the moves of
+# a game. returns nodes and seconds per move
+def measure_search(factory, positions) -> dict:
+    players = {}
+    nodes = 0
+    quiescence_nodes = 0
+    elapsed = 0.0
+    for state in positions:
+        cp = state.current_player
+        if cp not in players:
+            players[cp] = factory(cp)
+        start = time.perf_counter()
+        players[cp].choose_action(state)
+        elapsed += time.perf_counter() - start
+        nodes += players[cp].nodes_explored
+        quiescence_nodes += players[cp].quiescence_nodes
+    for p in players.values():
+        p.close()
+    return {
+        "nodes_per_move": nodes / len(positions),
+        "quiescence_nodes_per_move": quiescence_nodes / len(positions),
+        "time_per_move": elapsed / len(positions),
+    }
+
+
+# searches the same fixed positions once per value of one AlphaBetaPlayer option
+# and prints nodes and time per move, relative to the first value
+def compare_search_variants(option: str, choices, num_positions: int = 40, depth: int = 8,
+                            seed: int = 0, search_options: dict = None) -> dict:
+    positions = fixed_positions(num_positions, seed)
+    search_options = search_options or {}
+    results = {}
 
-    run_matchup(ai, rnd, num_games, "AlphaBeta(d=6, weighted) vs Random")
-    run_matchup(ai, greedy, num_games, "AlphaBeta(d=6, weighted) vs Greedy")
-    run_matchup(greedy, rnd, num_games, "Greedy vs Random")
+    for choice in choices:
+        factory = partial(AlphaBetaPlayer, max_depth=depth, eval_func="weighted",
+                          **{**search_options, option: choice})
+        factory = tag_stats(factory, compare=option, variant=choice)
+        results[choice] = measure_search(factory, positions)
+
+    print_search_table(option, results)
+    return results
+
+
+# one row per measure_search result, nodes and time relative to the first row
+def print_search_table(header: str, results: dict):
+    base = next(iter(results.values()))
+    width = max(10, len(header))
+    print(f"\n  {header:<{width}} {'nodes/move':>12} {'ms/move':>10} {'nodes':>8} {'time':>8}")
+    for name, r in results.items():
+        print(f"  {str(name):<{width}} {r['nodes_per_move']:>12.0f} {r['time_per_move'] * 1000:>10.1f}"
+              f" {r['nodes_per_move'] / base['nodes_per_move'] * 100:>7.0f}%"
+              f" {r['time_per_move'] / base['time_per_move'] * 100:>7.0f}%")
+
+
+def benchmark_move_ordering(num_positions: int = 40, depth: int = 8, seed: int = 0,
+                            search_options: dict = None):
+    print("\n" + "=" * 55)
+    print(f"  Move Ordering Comparison (depth {depth}, {num_positions} positions)")
+    print("=" * 55)
+    return compare_search_variants("ordering", ORDERINGS, num_positions, depth, seed,
+                                   search_options)
+
+
+def benchmark_algorithms(num_positions: int = 40, depth: int = 8, seed: int = 0,
+                         search_options: dict = None):
+    print("\n" + "=" * 55)
+    print(f"  Search Algorithm Comparison (depth {depth}, {num_positions} positions)")
+    print("=" * 55)
+    return compare_search_variants("algorithm", ALGORITHMS, num_positions, depth, seed,
+                                   search_options)
+
+
+# a shallow search with quiescence against the same depth without it and
+# against one ply deeper, from random openings so the games differ
+def benchmark_quiescence(num_games: int = 25, jobs: int = 1, seed: int = 0,
+                         search_options: dict = None, depth: int = 6, quiescence_depth: int = 4):
+    print("\n" + "=" * 55)
+    print(f"  Quiescence Search (depth {depth}, quiescence {quiescence_depth})")
+    print("=" * 55)
+
+    search_options = {**(search_options or {}), "quiescence_depth": 0}
+    quiet = partial(AlphaBetaPlayer, max_depth=depth, eval_func="weighted",
+                    **{**search_options, "quiescence_depth": quiescence_depth})
+    label = f"Depth {depth}+q{quiescence_depth}"
+    for d in (depth, depth + 1):
+        plain = partial(AlphaBetaPlayer, max_depth=d, eval_func="weighted", **search_options)
+        run_matchup(quiet, plain, num_games, f"{label} vs Depth {d}", jobs, seed, opening_plies=4)
+
+    positions = fixed_positions(seed=seed)
+    results = {
+        f"Depth {depth}": measure_search(partial(AlphaBetaPlayer, max_depth=depth,
+                                                 eval_func="weighted", **search_options), positions),
+        label: measure_search(quiet, positions),
+        f"Depth {depth + 1}": measure_search(partial(AlphaBetaPlayer, max_depth=depth + 1,
+                                                     eval_func="weighted", **search_options),
+                                             positions),
+    }
+    print_search_table("search", results)
+    q = results[label]
+    print(f"\n  quiescence nodes: {q['quiescence_nodes_per_move']:.0f}/move "
+          f"({q['quiescence_nodes_per_move'] / q['nodes_per_move'] * 100:.0f}% of the search)")
+    return results
+
+
+# micro-benchmark mode: times the engine hot paths instead of playing games.
+# returns the process exit status, 1 if the comparison found a regression
+def benchmark_micro(quick: bool, seed: int, baseline: str, save: bool, threshold: float) -> int:
+    from microbench import run_microbenchmarks, print_results, save_baseline, compare_to_baseline
+
+    print("\n" + "=" * 55)
+    print("  Micro-benchmarks")
+    print("=" * 55)
+
+    positions = fixed_positions(seed=seed)
+    if quick:
+        results = run_microbenchmarks(positions, repeats=3, loops=50, search_depth=4)
+    else:
+        results = run_microbenchmarks(positions)
+    print_results(results)
+
+    if save:
+        save_baseline(baseline, results)
+        print(f"\n  Saved baseline to {baseline}")
+        return 0
+    if not os.path.exists(baseline):
+        print(f"\n  No baseline at {baseline}, save one with --save-baseline")
+        return 0
+    regressions = compare_to_baseline(baseline, results, threshold)
+    if regressions:
+        print(f"\n  {len(regressions)} regression(s) above {threshold * 100:.0f}%: "
+              + ", ".join(regressions))
+        return 1
+    print(f"\n  No regressions above {threshold * 100:.0f}%")
+    return 0
+
+
+# tournament mode: a round-robin over the player specs (see tournament.parse_entrant)
+def benchmark_tournament(specs, max_pairs: int, margin: float, error: float, jobs: int, seed: int,
+                         search_options: dict = None, engine: dict = None) -> int:
+    from tournament import DEFAULT_ENTRANTS, parse_entrant, run_tournament
+
+    specs = specs or DEFAULT_ENTRANTS
+    try:
+        entrants = {spec: parse_entrant(spec, search_options, engine) for spec in specs}
+    except ValueError as e:
+        print(f"  {e}")
+        return 2
+    if len(entrants) < 2:
+        print("  a tournament needs at least two different players")
+        return 2
+
+    print("\n" + "=" * 55)
+    print(f"  Tournament ({len(entrants)} players, SPRT +-{margin:g} Elo, "
+          f"alpha=beta={error:g})")
+    print("=" * 55)
+    run_tournament(entrants, max_pairs, margin, error, error, jobs, seed)
+    return 0
 
 
 def main():
@@ -169,25 +391,106 @@ def main():
     parser.add_argument("--eval-compare", action="store_true")
     parser.add_argument("--depth-compare", action="store_true")
     parser.add_argument("--baselines", action="store_true")
+    parser.add_argument("--ordering-compare", action="store_true",
+                        help="nodes and time per move for each move ordering on fixed positions")
+    parser.add_argument("--algorithm-compare", action="store_true",
+                        help="nodes and time per move for alphabeta, pvs and mtdf on fixed positions")
+    parser.add_argument("--search-depth", type=int, default=8,
+                        help="depth for the ordering and algorithm comparisons")
+    parser.add_argument("--quiescence-compare", action="store_true",
+                        help="depth 6 with quiescence against depth 6 and 7 without")
+    parser.add_argument("--quiescence", type=int, default=0,
+                        help="quiescence depth for the AlphaBeta players (0 = off)")
+    parser.add_argument("--stats-log", default=None,
+                        help="append per-move search statistics as JSON lines to this file")
     parser.add_argument("--num-games", type=int, default=25)
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="worker processes for playing games (results do not depend on it)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="base seed, each game derives its own seed from it")
+    parser.add_argument("--book", default=None, help="opening book file for the AlphaBeta players")
+    parser.add_argument("--endgame", default=None, help="endgame table file for the AlphaBeta players")
+    parser.add_argument("--cache", default=None,
+                        help="persistent search cache (SQLite file) shared by the AlphaBeta players")
+    parser.add_argument("--tournament", action="store_true",
+                        help="round-robin with Elo ratings, each pairing stopped early by an SPRT")
+    parser.add_argument("--players", nargs="+", default=None,
+                        help="tournament entrants: random, greedy, ab[:depth=6,eval=weighted,...] "
+                             "or engine[:depth=6,...] for an engine speaking the engine protocol")
+    parser.add_argument("--engine-command", default=None,
+                        help="command line of the engine subprocess for engine players "
+                             "(default: engine_server.py --stdio)")
+    parser.add_argument("--engine-address", default=None,
+                        help="host:port of an engine_server.py serving the engine players")
+    parser.add_argument("--max-pairs", type=int, default=200,
+                        help="game pairs after which a tournament pairing stops unsettled")
+    parser.add_argument("--elo-margin", type=float, default=30.0,
+                        help="Elo difference the SPRT decides the sign of")
+    parser.add_argument("--sprt-error", type=float, default=0.05,
+                        help="SPRT error rate (alpha and beta)")
+    parser.add_argument("--micro", action="store_true",
+                        help="time the engine hot paths and a fixed-depth search instead of playing")
+    parser.add_argument("--baseline", default="microbench_baseline.json",
+                        help="micro-benchmark baseline file to compare against or save to")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="save this micro-benchmark run as the baseline")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="slowdown in percent that counts as a regression")
 
     args = parser.parse_args()
     num_games = 10 if args.quick else args.num_games
 
-    run_specific = args.eval_compare or args.depth_compare or args.baselines
+    if args.micro:
+        sys.exit(benchmark_micro(args.quick, args.seed, args.baseline, args.save_baseline,
+                                 args.threshold / 100))
+
+    run_specific = (args.eval_compare or args.depth_compare or args.baselines
+                    or args.ordering_compare or args.algorithm_compare or args.quiescence_compare)
+    search_options = {}
+    if args.book:
+        search_options["book_path"] = args.book
+    if args.endgame:
+        search_options["endgame_path"] = args.endgame
+    if args.cache:
+        search_options["cache_path"] = args.cache
+    if args.quiescence:
+        search_options["quiescence_depth"] = args.quiescence
+    if args.stats_log:
+        search_options["on_stats"] = JsonLinesSink(args.stats_log)
+
+    if args.tournament:
+        engine = {}
+        if args.engine_command:
+            engine["command"] = shlex.split(args.engine_command)
+        if args.engine_address:
+            engine["address"] = args.engine_address
+        sys.exit(benchmark_tournament(args.players, 10 if args.quick else args.max_pairs,
+                                      args.elo_margin, args.sprt_error, args.jobs, args.seed,
+                                      search_options, engine))
 
     print("\n" + "=" * 55)
     print("         KALAHA BENCHMARK")
     print("=" * 55)
 
     if not run_specific or args.baselines:
-        benchmark_against_baselines(num_games)
+        benchmark_against_baselines(num_games, args.jobs, args.seed, search_options)
 
     if not run_specific or args.eval_compare:
-        benchmark_eval_functions(num_games)
+        benchmark_eval_functions(num_games, args.jobs, args.seed, search_options)
 
     if not run_specific or args.depth_compare:
-        benchmark_search_depths(num_games)
+        benchmark_search_depths(num_games, args.jobs, args.seed, search_options)
+
+    if not run_specific or args.ordering_compare:
+        benchmark_move_ordering(depth=args.search_depth, seed=args.seed,
+                                search_options=search_options)
+
+    if not run_specific or args.algorithm_compare:
+        benchmark_algorithms(depth=args.search_depth, seed=args.seed,
+                             search_options=search_options)
+
+    if not run_specific or args.quiescence_compare:
+        benchmark_quiescence(num_games, args.jobs, args.seed, search_options)
 
     print("\n" + "=" * 55)
     print("  Done.")
@@ -0,0 +1,182 @@
+# endgame tablebase: exact results for every position with at most K stones left
+# in the pits. the stores do not change what is still to be won, so a position is
+# just the 12 pit counts plus the side to move, and its value is the margin
+# (stones the mover still gets minus stones the opponent still gets) under
+# perfect play from both sides.
+#
+# file layout: 8 byte header (magic, K) followed by one signed byte per position,
+# at index 2 * position_rank + side_to_move. the file is memory-mapped on the
+# first probe, so opening a player with a table costs nothing up front.
+#
+# build from the src directory with:  python endgame.py --max-stones 8
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from math import comb
+
+from game_engine import (
+    GameState, P1, P2, P1_pits, P2_pits, P1_store, P2_store,
+    actions, make_move, unmake_move
+)
+
+MAGIC = b"KTB1"
+HEADER = struct.Struct("<4sB3x")
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "endgame.bin")
+
+PITS = P1_pits + P2_pits
+NUM_PITS = len(PITS)
+# BINOM[n][k] = comb(n, k) for every n, k the rank can need
+BINOM = [[comb(n, k) for k in range(NUM_PITS)] for n in range(128 + NUM_PITS)]
+
+
+def positions_with(n):
+    return comb(n + NUM_PITS - 1, NUM_PITS - 1)
+
+
+# offsets[n] = number of positions with fewer than n stones in the pits
+def _rank_offsets(max_stones):
+    offsets = [0]
+    for n in range(max_stones + 1):
+        offsets.append(offsets[-1] + positions_with(n))
+    return offsets
+
+
+# combinatorial index of the pit counts: the 12 counts are read as a
+# stars-and-bars arrangement whose 11 bar positions are ranked in colex order
+def position_rank(board, offsets):
+    n = 0
+    rank = 0
+    for j in range(NUM_PITS - 1):
+        n += board[PITS[j]]
+        rank += BINOM[n + j][j + 1]
+    n += board[PITS[-1]]
+    return offsets[n] + rank
+
+
+def _compositions(n, parts):
+    if parts == 1:
+        yield (n,)
+        return
+    for first in range(n + 1):
+        for rest in _compositions(n - first, parts - 1):
+            yield (first,) + rest
+
+
+# every move that does not reach a store only pushes stones further along the
+# mover's own side, which strictly increases this number. so within one stone
+# count, positions with a higher potential never depend on lower ones.
+def _potential(counts):
+    return sum(c * (i % 6) for i, c in enumerate(counts))
+
+
+def build_table(max_stones, progress=True):
+    offsets = _rank_offsets(max_stones)
+    values = array("b", bytes(2 * offsets[-1]))
+    stores = (P1_store, P2_store)
+
+    for n in range(max_stones + 1):
+        start = time.time()
+        layer = sorted(_compositions(n, NUM_PITS), key=_potential, reverse=True)
+        for counts in layer:
+            board = [0] * 14
+            for pit, c in zip(PITS, counts):
+                board[pit] = c
+            rank = position_rank(board, offsets)
+
+            for mover in (P1, P2):
+                state = GameState(board[:], mover)
+                opp = 1 - mover
+                if state.p1_side == 0 or state.p2_side == 0:
+                    # game already over: each side's stones go to its own store
+                    own = state.p1_side if mover == P1 else state.p2_side
+                    values[2 * rank + mover] = own - (n - own)
+                    continue
+
+                best = None
+                for action in actions(state):
+                    undo = make_move(state, action)
+                    gain = state.board[stores[mover]] - state.board[stores[opp]]
+                    if state.p1_side or state.p2_side:
+                        child = values[2 * position_rank(state.board, offsets) + state.current_player]
+                        gain += child if state.current_player == mover else -child
+                    unmake_move(state, undo)
+                    if best is None or gain > best:
+                        best = gain
+                values[2 * rank + mover] = best
+
+        if progress:
+            sys.stdout.write(f"\r  {n} stones: {len(layer)} positions ({time.time() - start:.1f}s)   ")
+            sys.stdout.flush()
+    if progress:
+        print()
+    return values
+
+
+def write_table(path, max_stones, values):
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, max_stones))
+        f.write(values.tobytes())
+
+
+class EndgameTable:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.max_stones = -1
+        self._mm = None
+        self._offsets = None
+        self._loaded = False
+        self.hits = 0
+
+    def _load(self):
+        self._loaded = True
+        try:
+            with open(self.path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # missing or empty file: behave like a table with no positions
+            return
+        magic, max_stones = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not an endgame table")
+        self.max_stones = max_stones
+        self._offsets = _rank_offsets(max_stones)
+
+    # margin for the side to move, or None if the position is not in the table
+    def probe(self, state):
+        if not self._loaded:
+            self._load()
+        if state.p1_side + state.p2_side > self.max_stones:
+            return None
+        index = 2 * position_rank(state.board, self._offsets) + state.current_player
+        self.hits += 1
+        value = self._mm[HEADER.size + index]
+        return value - 256 if value > 127 else value
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Kalaha endgame table")
+    parser.add_argument("--max-stones", type=int, default=8,
+                        help="largest number of stones left in the pits")
+    parser.add_argument("--out", default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    if not 0 <= args.max_stones <= 127:
+        parser.error("--max-stones must be between 0 and 127")
+
+    start = time.time()
+    values = build_table(args.max_stones)
+    write_table(args.out, args.max_stones, values)
+    print(f"  wrote {len(values)} entries to {args.out} in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# a player that asks an engine over the engine_server protocol for its moves,
+# so it plays like AlphaBetaPlayer (choose_action) wherever that one is used.
+# the engine is either a subprocess speaking the protocol on stdin/stdout
+# (engine_server.py --stdio by default) or an engine server at host:port that
+# serves many such players at once. it is started or connected on the first move.
+import os
+import socket
+import subprocess
+import sys
+
+DEFAULT_COMMAND = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                "engine_server.py"), "--stdio"]
+
+
+class EngineError(Exception):
+    pass
+
+
+class EnginePlayer:
+    # command: argv of the engine subprocess, address: "host:port" of a server
+    # instead. movetime: seconds per move, None for a fixed-depth search.
+    # options are engine options (depth, eval, algorithm, ...) set before the game
+    def __init__(self, player_id, command=None, address=None, movetime=None, **options):
+        self.player_id = player_id
+        self.command = command or DEFAULT_COMMAND
+        self.address = address
+        self.movetime = movetime
+        self.options = options
+        # from the engine's info line for the last move
+        self.last_value = None
+        self.depth_reached = 0
+        self.nodes_explored = 0
+        self._proc = None
+        self._sock = None
+        self._in = None
+        self._out = None
+
+    def _connect(self):
+        if self.address is not None:
+            host, _, port = self.address.rpartition(":")
+            self._sock = socket.create_connection((host, int(port)))
+            self._in = self._sock.makefile("r", encoding="utf-8")
+            self._out = self._sock.makefile("w", encoding="utf-8")
+        else:
+            self._proc = subprocess.Popen(self.command, stdin=subprocess.PIPE,
+                                          stdout=subprocess.PIPE, text=True)
+            self._in, self._out = self._proc.stdout, self._proc.stdin
+        self._send("kalaha")
+        self._wait("kalahaok")
+        for name, value in self.options.items():
+            self._send(f"setoption name {name} value {value}")
+        self._send("isready")
+        self._wait("readyok")
+
+    def _send(self, line):
+        self._out.write(line + "\n")
+        self._out.flush()
+
+    # reads lines until one starting with `token`, returns it split into words
+    def _wait(self, token):
+        while True:
+            line = self._in.readline()
+            if not line:
+                raise EngineError("the engine closed the connection")
+            words = line.split()
+            if words[:3] == ["info", "string", "error"]:
+                raise EngineError(" ".join(words[3:]))
+            if words[:1] == ["info"]:
+                self._read_info(words[1:])
+            if words[:1] == [token]:
+                return words
+
+    def _read_info(self, words):
+        info = dict(zip(words[::2], words[1::2]))
+        if "depth" in info:
+            self.depth_reached = int(info["depth"])
+        if "nodes" in info:
+            self.nodes_explored = int(info["nodes"])
+        if "score" in info:
+            self.last_value = float(info["score"]) if info["score"] != "none" else None
+
+    def choose_action(self, state):
+        if self._in is None:
+            self._connect()
+        board = ",".join(str(v) for v in state.board)
+        self._send(f"position board {board} player {state.current_player}")
+        go = "go"
+        if self.movetime is not None:
+            go += f" movetime {round(self.movetime * 1000)}"
+        self._send(go)
+        words = self._wait("bestmove")
+        return int(words[1]) if words[1] != "none" else None
+
+    def close(self):
+        if self._in is None:
+            return
+        try:
+            self._send("quit")
+        except OSError:
+            pass
+        if self._proc is not None:
+            self._proc.stdin.close()
+            self._proc.wait(timeout=10)
+            self._proc.stdout.close()
+        if self._sock is not None:
+            self._in.close()
+            self._out.close()
+            self._sock.close()
+        self._proc = self._sock = self._in = self._out = None
@@ -0,0 +1,355 @@
+# line based engine protocol and an asyncio server that speaks it, so the AI can
+# be used from another process: over stdin/stdout (one game) or a local TCP
+# socket (one game per connection, any number of connections).
+#
+# commands, one per line, in the style of UCI:
+#   kalaha                      -> "id name ...", one "option ..." line per option, "kalahaok"
+#   isready                     -> "readyok"
+#   setoption name N value V    options: depth, eval, algorithm, ordering, quiescence, hash
+#   newgame                     back to the initial position
+#   position startpos [moves M ...]
+#   position board B0,...,B13 player P [moves M ...]
+#   go [depth D] [movetime MS]  -> "info depth D score S nodes N time MS nps R", "bestmove M"
+#   stop                        the running search answers now, with its deepest finished iteration
+#   stats                       -> "stats ..." counters of this game and of the server
+#   quit
+# moves are pit indices as in game_engine (0-5 for P1, 7-12 for P2). scores are
+# from the side to move. errors are answered with "info string error ...".
+#
+# searches run in a fixed pool of worker processes. a search waits for a free
+# worker, so at most `workers` run at once however many games are open. every
+# search deepens iteratively, so stop still gets a move back.
+#
+# run from the src directory with:  python engine_server.py --stdio
+#                               or:  python engine_server.py --port 7070 --workers 4
+import argparse
+import asyncio
+import math
+import multiprocessing
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from game_engine import (
+    GameState, initial_state, actions, result, terminal_test, Board_size, Total_stones
+)
+from evaluation import EVAL_FUNCTIONS
+from minmax_pruning import AlphaBetaPlayer, order_moves, ORDERINGS, ALGORITHMS
+
+ENGINE_NAME = "Kalaha AlphaBeta"
+
+# protocol option: (AlphaBetaPlayer keyword, type, default)
+OPTIONS = {
+    "depth": ("max_depth", int, 8),
+    "eval": ("eval_func", str, "weighted"),
+    "algorithm": ("algorithm", str, "alphabeta"),
+    "ordering": ("ordering", str, "history"),
+    "quiescence": ("quiescence_depth", int, 0),
+    "hash": ("tt_size_log2", int, 20),
+}
+_CHOICES = {
+    "eval": EVAL_FUNCTIONS,
+    "algorithm": ALGORITHMS,
+    "ordering": ORDERINGS,
+}
+
+# players kept by a worker process between searches, one per side and
+# configuration, so the tables they learn carry over from move to move
+_players = {}
+MAX_PLAYERS = 8
+
+
+# runs in a worker process. returns (move, score, depth, nodes, seconds)
+def search(config, board, current_player, depth, movetime, stop_event):
+    key = (current_player, tuple(sorted(config.items())))
+    ai = _players.get(key)
+    if ai is None:
+        if len(_players) >= MAX_PLAYERS:
+            _players.pop(next(iter(_players))).close()
+        ai = _players[key] = AlphaBetaPlayer(current_player, **config)
+    ai.max_depth = depth
+    state = GameState(list(board), current_player)
+    start = time.perf_counter()
+    time_limit = movetime if movetime is not None else math.inf
+    move = ai.choose_action(state, time_limit=time_limit, stop_event=stop_event)
+    if move is None:
+        # stopped before the first iteration finished
+        move = order_moves(state, actions(state))[0]
+    return move, ai.last_value, ai.depth_reached, ai.nodes_explored, time.perf_counter() - start
+
+
+class EngineServer:
+    def __init__(self, workers=2):
+        self.workers = workers
+        # spawned, not forked: a fork while the stdin thread holds its lock
+        # deadlocks the new worker
+        context = multiprocessing.get_context("spawn")
+        self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        # stop events have to reach searches already running in a worker
+        self._manager = context.Manager()
+        self._slots = asyncio.Semaphore(workers)
+        self.sessions = 0
+        self.queued = 0
+        self.running = 0
+        self.searches = 0
+        self.nodes = 0
+
+    def stop_event(self):
+        return self._manager.Event()
+
+    async def search(self, config, board, current_player, depth, movetime, stop_event):
+        self.queued += 1
+        async with self._slots:
+            self.queued -= 1
+            self.running += 1
+            try:
+                loop = asyncio.get_running_loop()
+                found = await loop.run_in_executor(
+                    self._pool, search, config, board, current_player, depth, movetime, stop_event)
+            finally:
+                self.running -= 1
+        self.searches += 1
+        self.nodes += found[3]
+        return found
+
+    def close(self):
+        self._pool.shutdown(cancel_futures=True)
+        self._manager.shutdown()
+
+    # one game over a pair of asyncio streams (a socket connection or stdin/stdout)
+    async def serve(self, reader, writer):
+        session = Session(self, writer)
+        self.sessions += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not await session.handle(line.decode().strip()):
+                    break
+        finally:
+            await session.close()
+            self.sessions -= 1
+            writer.close()
+
+
+class Session:
+    def __init__(self, server, writer):
+        self.server = server
+        self.writer = writer
+        self.options = {name: default for name, (_, _, default) in OPTIONS.items()}
+        self.state = initial_state()
+        self.searches = 0
+        self.nodes = 0
+        self.last = None
+        self._task = None
+        self._stop = None
+
+    def send(self, line):
+        self.writer.write((line + "\n").encode())
+
+    def error(self, message):
+        self.send(f"info string error {message}")
+
+    async def close(self):
+        if self._task is not None:
+            self._stop.set()
+            await self._task
+
+    # returns False when the session is over
+    async def handle(self, line):
+        if not line:
+            return True
+        command, *args = line.split()
+        handler = getattr(self, f"_cmd_{command}", None)
+        if handler is None:
+            self.error(f"unknown command {command}")
+        else:
+            try:
+                handler(args)
+            except ValueError as e:
+                self.error(str(e))
+            except Exception as e:
+                # a bad command must not end the session
+                self.error(f"{command} failed: {e!r}")
+        if command == "quit":
+            return False
+        await self.writer.drain()
+        return True
+
+    def _cmd_kalaha(self, args):
+        self.send(f"id name {ENGINE_NAME}")
+        for name, (_, kind, default) in OPTIONS.items():
+            self.send(f"option name {name} type {kind.__name__} default {default}")
+        self.send("kalahaok")
+
+    def _cmd_isready(self, args):
+        self.send("readyok")
+
+    def _cmd_quit(self, args):
+        pass
+
+    def _cmd_setoption(self, args):
+        if len(args) != 4 or args[0] != "name" or args[2] != "value":
+            raise ValueError("usage: setoption name <name> value <value>")
+        name, value = args[1], args[3]
+        if name not in OPTIONS:
+            raise ValueError(f"unknown option {name}")
+        value = OPTIONS[name][1](value)
+        if name in _CHOICES and value not in _CHOICES[name]:
+            raise ValueError(f"{name} must be one of {', '.join(_CHOICES[name])}")
+        self.options[name] = value
+
+    def _cmd_newgame(self, args):
+        self._busy()
+        self.state = initial_state()
+
+    def _cmd_position(self, args):
+        self._busy()
+        if args[:1] == ["startpos"]:
+            state, rest = initial_state(), args[1:]
+        elif args[:1] == ["board"] and len(args) >= 4 and args[2] == "player":
+            board = [int(v) for v in args[1].split(",")]
+            if len(board) != Board_size or min(board) < 0 or args[3] not in ("0", "1"):
+                raise ValueError(f"a board is {Board_size} comma separated counts, player 0 or 1")
+            # the zobrist keys only cover boards with at most Total_stones stones
+            if max(board) > Total_stones or sum(board) > Total_stones:
+                raise ValueError(f"a board holds at most {Total_stones} stones")
+            state, rest = GameState(board, int(args[3])), args[4:]
+        else:
+            raise ValueError("usage: position startpos|board B0,...,B13 player P [moves M ...]")
+        if rest and rest[0] != "moves":
+            raise ValueError(f"unexpected {rest[0]}")
+        for move in rest[1:]:
+            if terminal_test(state) or int(move) not in actions(state):
+                raise ValueError(f"illegal move {move}")
+            state = result(state, int(move))
+        self.state = state
+
+    def _cmd_go(self, args):
+        self._busy()
+        depth = self.options["depth"]
+        movetime = None
+        for name, value in zip(args[::2], args[1::2]):
+            if name == "depth":
+                depth = int(value)
+            elif name == "movetime":
+                movetime = int(value) / 1000
+            else:
+                raise ValueError(f"unknown go parameter {name}")
+        if terminal_test(self.state):
+            self.send("bestmove none")
+            return
+        config = {OPTIONS[name][0]: value for name, value in self.options.items() if name != "depth"}
+        self._stop = self.server.stop_event()
+        self._task = asyncio.ensure_future(self._search(config, depth, movetime))
+
+    def _cmd_stop(self, args):
+        if self._stop is not None:
+            self._stop.set()
+
+    def _cmd_stats(self, args):
+        server = self.server
+        last = ""
+        if self.last is not None:
+            last = " last_depth {} last_nodes {} last_time {}".format(*self.last)
+        self.send(f"stats searches {self.searches} nodes {self.nodes}{last}"
+                  f" server_sessions {server.sessions} server_running {server.running}"
+                  f" server_queued {server.queued} server_searches {server.searches}"
+                  f" server_nodes {server.nodes} server_workers {server.workers}")
+
+    def _busy(self):
+        if self._task is not None:
+            raise ValueError("a search is running, stop it first")
+
+    async def _search(self, config, depth, movetime):
+        state = self.state
+        try:
+            move, value, reached, nodes, elapsed = await self.server.search(
+                config, state.board, state.current_player, depth, movetime, self._stop)
+        except Exception as e:
+            self.error(f"search failed: {e!r}")
+            self.send(f"bestmove {order_moves(state, actions(state))[0]}")
+        else:
+            self.searches += 1
+            self.nodes += nodes
+            self.last = (reached, nodes, round(elapsed * 1000))
+            score = f"{value:.2f}" if value is not None else "none"
+            nps = round(nodes / elapsed) if elapsed > 0 else 0
+            self.send(f"info depth {reached} score {score} nodes {nodes}"
+                      f" time {round(elapsed * 1000)} nps {nps}")
+            self.send(f"bestmove {move}")
+        finally:
+            self._task = None
+            self._stop = None
+        await self.writer.drain()
+
+
+# stdin and stdout with the parts of the asyncio stream interface a session
+# uses. stdin is read by a daemon thread, that works for pipes, files and
+# consoles on every platform and does not keep the process alive after quit.
+# writes are small and flushed at once
+class _StdinReader:
+    def __init__(self):
+        self._lines = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        threading.Thread(target=self._read, args=(loop,), daemon=True).start()
+
+    def _read(self, loop):
+        # unbuffered: a daemon thread blocked inside a buffered reader's lock
+        # aborts the interpreter at exit
+        stdin = open(sys.stdin.fileno(), "rb", buffering=0, closefd=False)
+        for line in stdin:
+            loop.call_soon_threadsafe(self._lines.put_nowait, line)
+        loop.call_soon_threadsafe(self._lines.put_nowait, b"")
+
+    async def readline(self):
+        return await self._lines.get()
+
+
+class _StdoutWriter:
+    def write(self, data):
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+async def main_async(args):
+    server = EngineServer(args.workers)
+    try:
+        if args.stdio:
+            await server.serve(_StdinReader(), _StdoutWriter())
+            return
+        listener = await asyncio.start_server(server.serve, args.host, args.port)
+        print(f"  serving on {args.host}:{args.port} with {args.workers} workers", file=sys.stderr)
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kalaha engine server")
+    parser.add_argument("--stdio", action="store_true", help="play one game over stdin/stdout")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7070)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes, the most searches that run at once "
+                             "(default 1 with --stdio, 2 otherwise)")
+    args = parser.parse_args()
+    if args.workers is None:
+        args.workers = 1 if args.stdio else 2
+    try:
+        asyncio.run(main_async(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
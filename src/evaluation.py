@@ -3,6 +3,8 @@ from game_engine import (
     actions, result, terminal_test, utility, score, player,
     opposite_pit
 )
+import json
+import os
 
 # three evaluation functions, compared in benchmarking
 
@@ -13,91 +15,149 @@ def evaluate_score_difference(state, max_player):
     return score(state, max_player) - score(state, min_player)
 
 
-#2: weighted combination of store diff, side stones, capture potential, extra turn potential
-def eval_weighted(state, max_player):
-    min_player = 1 - max_player
-    board = state.board
-
-    if max_player == P1:
-        my_pits, opp_pits = P1_pits, P2_pits
-        my_store, opp_store = P1_store, P2_store
-    else:
-        my_pits, opp_pits = P2_pits, P1_pits
-        my_store, opp_store = P2_store, P1_store
-
-    score_diff= evaluate_score_difference(state, max_player)
-
-    my_side = sum(board[i] for i in my_pits)
-    opp_side = sum(board[i] for i in opp_pits)
-    stone_diff = my_side - opp_side
+# default weights of the tunable evaluators. tune_eval.py fits new ones and
+# writes them to a config file, see load_eval_config
+WEIGHTED_DEFAULTS = {"score_diff": 5.0, "stone_diff": 2.0, "capture": 2.0, "extra_turn": 3.0}
+POSITIONAL_DEFAULTS = {"score_diff": 5.0, "positional": 1.5, "gradient": 0.3, "capture": 2.0}
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_weights.json")
 
-    # empty pits where the opposite side has stones = capture opportunity
-    capture_potential = 0
-    for pit in my_pits:
-        if board[pit] == 0:
-            opp = opposite_pit(pit)
-            capture_potential += board[opp]
 
-    # count pits that would land exactly in the store
-    extra_turn_potential = 0
-    for pit in my_pits:
-        if board[pit] > 0:
-            distance_to_store = (my_store - pit) % 14
-            if board[pit] == distance_to_store:
-                extra_turn_potential += 1
-
-    w1 = 5.0
-    w2 = 2.0
-    w3 = 2.0
-    w4 = 3.0
-
-    return (w1 * score_diff + w2 * stone_diff + w3 * capture_potential + w4 * extra_turn_potential)
+#2: weighted combination of store diff, side stones, capture potential, extra turn potential
+def make_eval_weighted(weights):
+    w1 = weights["score_diff"]
+    w2 = weights["stone_diff"]
+    w3 = weights["capture"]
+    w4 = weights["extra_turn"]
+
+    def eval_weighted(state, max_player):
+        min_player = 1 - max_player
+        board = state.board
+
+        if max_player == P1:
+            my_pits, opp_pits = P1_pits, P2_pits
+            my_store, opp_store = P1_store, P2_store
+        else:
+            my_pits, opp_pits = P2_pits, P1_pits
+            my_store, opp_store = P2_store, P1_store
+
+        score_diff= evaluate_score_difference(state, max_player)
+
+        # the state keeps the stones per side, no need to re-sum the pits
+        if max_player == P1:
+            stone_diff = state.p1_side - state.p2_side
+        else:
+            stone_diff = state.p2_side - state.p1_side
+
+        # empty pits where the opposite side has stones = capture opportunity
+        capture_potential = 0
+        for pit in my_pits:
+            if board[pit] == 0:
+                opp = opposite_pit(pit)
+                capture_potential += board[opp]
+
+        # count pits that would land exactly in the store
+        extra_turn_potential = 0
+        for pit in my_pits:
+            if board[pit] > 0:
+                distance_to_store = (my_store - pit) % 14
+                if board[pit] == distance_to_store:
+                    extra_turn_potential += 1
+
+        return (w1 * score_diff + w2 * stone_diff + w3 * capture_potential + w4 * extra_turn_potential)
+
+    eval_weighted.base = "weighted"
+    eval_weighted.weights = dict(weights)
+    return eval_weighted
 
 
 #3: positional - weights stones higher the closer they are to the store
-def eval_positional(state, max_player):
-    min_player = 1 - max_player
-    board = state.board
-
-    if max_player == P1:
-        my_pits, opp_pits = P1_pits, P2_pits
-        my_store, opp_store = P1_store, P2_store
-    else:
-        my_pits, opp_pits = P2_pits, P1_pits
-        my_store, opp_store = P2_store, P1_store
-
-    score_diff= evaluate_score_difference(state, max_player)
-
-    # late game: most stones are in stores, just use score diff
-    total_stones = sum(board)
-    stones_in_stores = board[P1_store] + board[P2_store]
-    if stones_in_stores > total_stones * 0.7:
-        return score_diff * 10
-
-    # stones closer to the store get a higher weight. not perfect but works reasonably well, explained in report
-    positional_score = 0
-    for idx, pit in enumerate(my_pits):
-        weight = 1.0 + idx * 0.3
-        positional_score += board[pit] * weight
-
-    opp_positional = 0
-    for idx, pit in enumerate(opp_pits):
-        weight = 1.0 + idx * 0.3
-        opp_positional += board[pit] * weight
-
-    positional_diff = positional_score - opp_positional
-
-    capture_potential = 0
-    for pit in my_pits:
-        if board[pit] == 0:
-            opp = opposite_pit(pit)
-            capture_potential += board[opp]
-
-    return (5.0 * score_diff + 1.5 * positional_diff + 2.0 * capture_potential)
-
+def make_eval_positional(weights):
+    w_score = weights["score_diff"]
+    w_positional = weights["positional"]
+    gradient = weights["gradient"]
+    w_capture = weights["capture"]
+
+    def eval_positional(state, max_player):
+        min_player = 1 - max_player
+        board = state.board
+
+        if max_player == P1:
+            my_pits, opp_pits = P1_pits, P2_pits
+            my_store, opp_store = P1_store, P2_store
+        else:
+            my_pits, opp_pits = P2_pits, P1_pits
+            my_store, opp_store = P2_store, P1_store
+
+        score_diff= evaluate_score_difference(state, max_player)
+
+        # late game: most stones are in stores, just use score diff
+        stones_in_stores = board[P1_store] + board[P2_store]
+        total_stones = stones_in_stores + state.p1_side + state.p2_side
+        if stones_in_stores > total_stones * 0.7:
+            return score_diff * 10
+
+        # stones closer to the store get a higher weight. not perfect but works reasonably well, explained in report
+        positional_score = 0
+        for idx, pit in enumerate(my_pits):
+            weight = 1.0 + idx * gradient
+            positional_score += board[pit] * weight
+
+        opp_positional = 0
+        for idx, pit in enumerate(opp_pits):
+            weight = 1.0 + idx * gradient
+            opp_positional += board[pit] * weight
+
+        positional_diff = positional_score - opp_positional
+
+        capture_potential = 0
+        for pit in my_pits:
+            if board[pit] == 0:
+                opp = opposite_pit(pit)
+                capture_potential += board[opp]
+
+        return (w_score * score_diff + w_positional * positional_diff + w_capture * capture_potential)
+
+    eval_positional.base = "positional"
+    eval_positional.weights = dict(weights)
+    return eval_positional
+
+
+eval_weighted = make_eval_weighted(WEIGHTED_DEFAULTS)
+eval_positional = make_eval_positional(POSITIONAL_DEFAULTS)
+
+EVAL_FACTORIES = {
+    "weighted": make_eval_weighted,
+    "positional": make_eval_positional,
+}
 
 EVAL_FUNCTIONS = {
     "simple": evaluate_score_difference,
     "weighted": eval_weighted,
     "positional": eval_positional,
 }
+# a weights config may not replace these
+BUILTIN_EVAL_FUNCTIONS = tuple(EVAL_FUNCTIONS)
+
+
+# registers the evaluators of a weights config in EVAL_FUNCTIONS. the config maps
+# a name to the evaluator it is based on and its weights, e.g.
+#   {"weighted_tuned": {"base": "weighted", "weights": {"score_diff": 4.1, ...}}}
+# weights missing from an entry keep their default. the built-in names are
+# rejected. returns the names added
+def load_eval_config(path=DEFAULT_CONFIG_PATH):
+    with open(path) as f:
+        config = json.load(f)
+    defaults = {"weighted": WEIGHTED_DEFAULTS, "positional": POSITIONAL_DEFAULTS}
+    for name, entry in config.items():
+        if name in BUILTIN_EVAL_FUNCTIONS:
+            raise ValueError(f"{path}: {name} is a built-in evaluator, pick another name")
+        base = entry["base"]
+        if base not in EVAL_FACTORIES:
+            raise ValueError(f"{path}: {name} has unknown base evaluator {base!r}")
+        EVAL_FUNCTIONS[name] = EVAL_FACTORIES[base]({**defaults[base], **entry["weights"]})
+    return list(config)
+
+
+# tuned weights next to this file are picked up on import
+if os.path.exists(DEFAULT_CONFIG_PATH):
+    load_eval_config(DEFAULT_CONFIG_PATH)
@@ -1,4 +1,6 @@
 from dataclasses import dataclass, field
+from typing import NamedTuple
+import random
 
 P1 = 0
 P2 = 1
@@ -8,18 +10,170 @@ P1_store = 6
 P2_pits  = [7, 8, 9, 10, 11, 12]
 P2_store = 13
 Board_size = 14
+Total_stones = 48
+
+# bit i is set in a state's nonempty mask when pit i has stones
+P1_mask = sum(1 << i for i in P1_pits)
+P2_mask = sum(1 << i for i in P2_pits)
+
+# zobrist keys: one random number per (pit, stone count), plus one for P2 to move.
+# fixed seed so hashes are the same in every process
+_zobrist_rng = random.Random(0x4B414C41)
+ZOBRIST_PITS = [[_zobrist_rng.getrandbits(64) for _ in range(Total_stones + 1)]
+                for _ in range(Board_size)]
+ZOBRIST_SIDE = _zobrist_rng.getrandbits(64)
 
 # to find the oppoite pit.
 def opposite_pit(i: int) -> int:
     return 12 - i
 
+
+# sowing is fully determined by (pit, stone count), since the pit also fixes the
+# player. SOW_TABLE[pit][stones] = (deltas, last, extra_turn, own_landing,
+#                                   p1_delta, p2_delta, keep_mask, set_mask):
+#   deltas      - (index, increment) for every pit that changes, including the
+#                 emptied pit and full laps for big piles
+#   last        - index where the last stone lands
+#   extra_turn  - last stone lands in the mover's store
+#   own_landing - last stone lands in one of the mover's pits (capture candidate)
+#   p1_delta, p2_delta - change in the stones on each side
+#   keep_mask, set_mask - new nonempty mask is (mask & keep_mask) | set_mask
+def _build_sow_table():
+    table = [None] * Board_size
+    for pit in P1_pits + P2_pits:
+        if pit in P1_pits:
+            own_pits, own_store, opponent_store = P1_pits, P1_store, P2_store
+        else:
+            own_pits, own_store, opponent_store = P2_pits, P2_store, P1_store
+        entries = []
+        for stones in range(Total_stones + 1):
+            increments = [0] * Board_size
+            increments[pit] -= stones
+            index = pit
+            left = stones
+            while left > 0:
+                index = (index + 1) % Board_size
+                if index == opponent_store:
+                    continue
+                increments[index] += 1
+                left -= 1
+            deltas = tuple((i, increments[i]) for i in range(Board_size) if increments[i] != 0)
+            p1_delta = sum(increments[i] for i in P1_pits)
+            p2_delta = sum(increments[i] for i in P2_pits)
+            # the sown pit ends up holding only what full laps put back into it
+            laps = increments[pit] + stones
+            set_mask = sum(1 << i for i in P1_pits + P2_pits
+                           if increments[i] > 0 or (i == pit and laps > 0))
+            keep_mask = (P1_mask | P2_mask) & ~(1 << pit)
+            entries.append((deltas, index, index == own_store, index in own_pits,
+                            p1_delta, p2_delta, keep_mask, set_mask))
+        table[pit] = entries
+    return table
+
+SOW_TABLE = _build_sow_table()
+
+# what a move does, from the pit and its stone count alone:
+# LANDING_TABLE[pit][stones] = (last, extra_turn, own_landing, last_delta, opposite_delta),
+# where last_delta and opposite_delta are what the sowing adds to the landing pit
+# and to the pit opposite it (full laps and the emptied pit included)
+def _build_landing_table():
+    table = [None] * Board_size
+    for pit in P1_pits + P2_pits:
+        entries = []
+        for deltas, last, extra_turn, own_landing, *_ in SOW_TABLE[pit]:
+            increments = dict(deltas)
+            entries.append((last, extra_turn, own_landing, increments.get(last, 0),
+                            increments.get(opposite_pit(last), 0) if own_landing else 0))
+        table[pit] = entries
+    return table
+
+LANDING_TABLE = _build_landing_table()
+
+QUIET = 0
+EXTRA_TURN = 1
+CAPTURE = 2
+
+# EXTRA_TURN if the last stone lands in the mover's store, CAPTURE if it lands
+# in an empty pit of the mover's and the opposite pit has stones after the
+# sowing, QUIET otherwise. exact for moves that pass the opponent's store or
+# go round the board
+def move_kind(board, action):
+    last, extra_turn, own_landing, last_delta, opposite_delta = \
+        LANDING_TABLE[action][board[action]]
+    if extra_turn:
+        return EXTRA_TURN
+    if (own_landing and board[last] + last_delta == 1
+            and board[opposite_pit(last)] + opposite_delta > 0):
+        return CAPTURE
+    return QUIET
+
+# pits to play for each 6-bit side mask, in board order
+_side_moves = [[i for i in range(6) if m >> i & 1] for m in range(64)]
+ACTIONS_BY_MASK = (
+    _side_moves,
+    [[i + 7 for i in moves] for moves in _side_moves],
+)
+
+def zobrist_hash(board, current_player) -> int:
+    h = ZOBRIST_SIDE if current_player == P2 else 0
+    for i in range(Board_size):
+        h ^= ZOBRIST_PITS[i][board[i]]
+    return h
+
+def nonempty_mask(board) -> int:
+    return sum(1 << i for i in P1_pits + P2_pits if board[i] > 0)
+
 @dataclass
 class GameState:
     board: list
     current_player: int
+    # kept up to date by result() and make_move(), computed from scratch if not given
+    zobrist: int = None
+    p1_side: int = None
+    p2_side: int = None
+    nonempty: int = None
+
+    def __post_init__(self):
+        if self.zobrist is None:
+            self.zobrist = zobrist_hash(self.board, self.current_player)
+        if self.nonempty is None:
+            self.p1_side = sum(self.board[i] for i in P1_pits)
+            self.p2_side = sum(self.board[i] for i in P2_pits)
+            self.nonempty = nonempty_mask(self.board)
+
+    def copy(self):
+        return GameState(self.board[:], self.current_player, self.zobrist,
+                         self.p1_side, self.p2_side, self.nonempty)
+
+    def pack(self):
+        return PackedState(bytes(self.board), self.current_player, self.zobrist,
+                           self.p1_side, self.p2_side, self.nonempty)
+
+
+# immutable compact state for the search: the 14 pits are one bytes object and
+# there is no per-instance __dict__. board[i] works the same as on GameState, so
+# actions/result/terminal_test/score and the evaluators take either form.
+class PackedState(NamedTuple):
+    board: bytes
+    current_player: int
+    zobrist: int
+    p1_side: int
+    p2_side: int
+    nonempty: int
+
+    def __hash__(self):
+        return self.zobrist
 
     def copy(self):
-        return GameState(board=self.board[:], current_player=self.current_player)
+        return self
+
+    def pack(self):
+        return self
+
+    def unpack(self):
+        return GameState(list(self.board), self.current_player, self.zobrist,
+                         self.p1_side, self.p2_side, self.nonempty)
+
 
 def initial_state():
     return GameState(
@@ -33,62 +187,116 @@ def player(state):
 
 def actions(state):
     if state.current_player == P1:
-        pits = P1_pits
-    else:
-        pits = P2_pits
-
-    return [i for i in pits if state.board[i] > 0]
+        return ACTIONS_BY_MASK[P1][state.nonempty & 63][:]
+    return ACTIONS_BY_MASK[P2][state.nonempty >> 7 & 63][:]
 
+# returns a new state of the same kind as the one passed in. the move itself is
+# make_move on a copy, so the rules and the hashing live in one place
 def result(state, action):
-    new_state= state.copy()
-    board= new_state.board
-    current_player = new_state.current_player
-
-    opponent_store = P2_store if current_player == P1 else P1_store
-    own_store = P1_store if current_player == P1 else P2_store
-    own_pits = P1_pits if current_player == P1 else P2_pits
-
-    stones=board[action]
-    board[action] = 0
-
-    index=action
-    while stones >0:
-        index = (index + 1) % Board_size
-        if index == opponent_store:
-            continue
-        board[index] += 1
-        stones -= 1
-
-    # if the last stone lands in own store, player gets another turn
-    extra_turn = (index == own_store)
-
-    if not extra_turn and index in own_pits and board[index] == 1:
-        opp = opposite_pit(index)
-        if board[opp] > 0:
-            board[own_store] += board[opp] + 1
-            board[index] = 0
+    if type(state) is PackedState:
+        # a bytearray copies in and out of bytes without converting every pit
+        child = GameState(bytearray(state.board), state.current_player, state.zobrist,
+                          state.p1_side, state.p2_side, state.nonempty)
+        make_move(child, action)
+        return PackedState(bytes(child.board), child.current_player, child.zobrist,
+                           child.p1_side, child.p2_side, child.nonempty)
+    child = state.copy()
+    make_move(child, action)
+    return child
+
+
+# plays a move in place, for the search and for result(). mutates a GameState
+# (its board a list, or a bytearray for result() on a PackedState) and returns
+# an undo record for unmake_move:
+#   (action, stones, player, zobrist, p1_side, p2_side, nonempty, captured, swept)
+#   captured - stones taken from the opposite pit, 0 if there was no capture
+#   swept    - the board before the end-of-game sweep, None if the game goes on
+def make_move(state, action):
+    board = state.board
+    current_player = state.current_player
+    prev_h = h = state.zobrist
+    prev_p1 = p1_side = state.p1_side
+    prev_p2 = p2_side = state.p2_side
+    prev_mask = state.nonempty
+    zp = ZOBRIST_PITS
+
+    stones = board[action]
+    (deltas, last, extra_turn, own_landing,
+     p1_delta, p2_delta, keep_mask, set_mask) = SOW_TABLE[action][stones]
+    for i, d in deltas:
+        v = board[i]
+        board[i] = v + d
+        h ^= zp[i][v] ^ zp[i][v + d]
+    p1_side += p1_delta
+    p2_side += p2_delta
+    nonempty = (prev_mask & keep_mask) | set_mask
+
+    captured = 0
+    if own_landing and board[last] == 1:
+        opp = opposite_pit(last)
+        captured = board[opp]
+        if captured > 0:
+            own_store = P1_store if current_player == P1 else P2_store
+            store = board[own_store]
+            h ^= zp[last][1] ^ zp[last][0]
+            h ^= zp[opp][captured] ^ zp[opp][0]
+            h ^= zp[own_store][store] ^ zp[own_store][store + captured + 1]
+            board[own_store] = store + captured + 1
+            board[last] = 0
             board[opp] = 0
+            if current_player == P1:
+                p1_side -= 1
+                p2_side -= captured
+            else:
+                p2_side -= 1
+                p1_side -= captured
+            nonempty &= ~((1 << last) | (1 << opp))
 
-    p1_empty = all(board[i] == 0 for i in P1_pits)
-    p2_empty = all(board[i] == 0 for i in P2_pits)
+    swept = None
+    if p1_side == 0 or p2_side == 0:
+        swept = board[:]
+        board[P1_store] += p1_side
+        board[P2_store] += p2_side
+        board[0:6] = board[7:13] = [0] * 6
+        p1_side = p2_side = nonempty = 0
+        h = zobrist_hash(board, current_player)
+    elif not extra_turn:
+        state.current_player = 1 - current_player
+        h ^= ZOBRIST_SIDE
 
-    if p1_empty or p2_empty:
-        for i in P1_pits:
-            board[P1_store] += board[i]
-            board[i] = 0
-        for i in P2_pits:
-            board[P2_store] += board[i]
-            board[i] = 0
-    else:
-        if not extra_turn:
-            new_state.current_player = 1 - current_player
+    state.zobrist = h
+    state.p1_side = p1_side
+    state.p2_side = p2_side
+    state.nonempty = nonempty
+    return (action, stones, current_player, prev_h, prev_p1, prev_p2, prev_mask,
+            captured, swept)
+
+
+def unmake_move(state, undo):
+    action, stones, prev_player, prev_h, prev_p1, prev_p2, prev_mask, captured, swept = undo
+    board = state.board
+
+    if swept is not None:
+        board[:] = swept
+    entry = SOW_TABLE[action][stones]
+    if captured:
+        last = entry[1]
+        own_store = P1_store if prev_player == P1 else P2_store
+        board[own_store] -= captured + 1
+        board[last] = 1
+        board[opposite_pit(last)] = captured
+    for i, d in entry[0]:
+        board[i] -= d
 
-    return new_state
+    state.current_player = prev_player
+    state.zobrist = prev_h
+    state.p1_side = prev_p1
+    state.p2_side = prev_p2
+    state.nonempty = prev_mask
 
+# constant time: the state keeps how many stones each side has
 def terminal_test(state):
-    P1_empty = all(state.board[i] == 0 for i in P1_pits)
-    P2_empty = all(state.board[i] == 0 for i in P2_pits)
-    return P1_empty or P2_empty
+    return state.p1_side == 0 or state.p2_side == 0
 
 def utility(state, player_id):
     P1_score = state.board[P1_store]
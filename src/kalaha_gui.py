@@ -1,13 +1,13 @@
 import pygame
 import sys
-import threading
 from enum import Enum
 from game_engine import (
     GameState, P1, P2, P1_pits, P2_pits, P1_store, P2_store,
     actions, result, terminal_test, player, initial_state
 )
-from minmax_pruning import AlphaBetaPlayer
+from minmax_pruning import AlphaBetaPlayer, order_moves
 from evaluation import EVAL_FUNCTIONS
+from search_worker import SearchWorker
 
 # Colors
 BLACK = (0, 0, 0)
@@ -20,6 +20,20 @@ RED = (220, 20, 60)
 BLUE = (30, 144, 255)
 YELLOW = (255, 255, 0)
 
+# (depth cap, seconds per move) for each difficulty; the AI deepens until the time runs out
+DIFFICULTY_EASY = (4, 0.5)
+DIFFICULTY_MEDIUM = (6, 1.0)
+DIFFICULTY_HARD = (20, 2.0)
+
+FPS = 60
+# after this long without input or anything changing on screen the loop stops
+# drawing frames and sleeps until the next event, leaving the CPU to the search
+IDLE_AFTER_MS = 500
+# the longest an idle loop sleeps, so timers keep running
+IDLE_WAIT_MS = 250
+# posted by the search worker when a search finishes, wakes an idle loop
+AI_DONE = pygame.USEREVENT + 1
+
 
 class GameMode(Enum):
     HOME = 1
@@ -69,6 +83,15 @@ class KalahGUI:
         self.message_timer = 0
         self.ai_thinking = False
         self.ai_move = None
+        # runs the AI's move searches and pondering, one at a time. every new
+        # game is a new generation, so a search of an old game never moves here
+        self.worker = SearchWorker(on_result=lambda: pygame.event.post(pygame.event.Event(AI_DONE)))
+
+        # pondering: while the human thinks, the AI searches its replies to the
+        # human's possible moves. finished replies are kept by position key and
+        # the searches also fill the AI's transposition table
+        self._ponder_key = None
+        self._ponder_moves = {}
 
         self.pit_radius = 40
         self.store_radius = 60
@@ -82,6 +105,10 @@ class KalahGUI:
 
         self._legal_moves_cache = set()
         self._cached_state_id = None
+        # dirty-rectangle rendering: what every screen region showed when it was
+        # last drawn, see draw(). a new mode redraws the whole screen
+        self._drawn = {}
+        self._drawn_mode = None
         self.setup_buttons()
         self._precompute_positions()
 
@@ -127,11 +154,11 @@ class KalahGUI:
         self.btn_play = Button(center_x - button_width // 2, 250, button_width, button_height, 
                               "Play vs AI", GREEN, WHITE)
         self.btn_ai_easy = Button(center_x - button_width // 2, 320, button_width, button_height,
-                                 "AI Easy (Depth 4)", BLUE, WHITE)
+                                 "AI Easy (0.5s)", BLUE, WHITE)
         self.btn_ai_medium = Button(center_x - button_width // 2, 390, button_width, button_height,
-                                   "AI Medium (Depth 6)", BLUE, WHITE)
+                                   "AI Medium (1s)", BLUE, WHITE)
         self.btn_ai_hard = Button(center_x - button_width // 2, 460, button_width, button_height,
-                                 "AI Hard (Depth 8)", BLUE, WHITE)
+                                 "AI Hard (2s)", BLUE, WHITE)
         self.btn_quit = Button(center_x - button_width // 2, 530, button_width, button_height,
                               "Quit", RED, WHITE)
         
@@ -169,16 +196,18 @@ class KalahGUI:
             self.screen.blit(text, (100, y))
             y += 25
 
-    def draw_pit(self, x, y, pit_idx, legal_moves, is_hovered=False):
-        stones = self.state.board[pit_idx]
-        color = LIGHT_BROWN
-
+    def _pit_color(self, pit_idx, legal_moves):
         if pit_idx == self.selected_pit:
-            color = YELLOW
-        elif is_hovered and pit_idx in P1_pits:
-            color = (255, 200, 100)
-        elif pit_idx in legal_moves:
-            color = (200, 220, 100)
+            return YELLOW
+        if pit_idx == self.hovered_pit and pit_idx in P1_pits:
+            return (255, 200, 100)
+        if pit_idx in legal_moves:
+            return (200, 220, 100)
+        return LIGHT_BROWN
+
+    def draw_pit(self, x, y, pit_idx, legal_moves):
+        stones = self.state.board[pit_idx]
+        color = self._pit_color(pit_idx, legal_moves)
 
         ix, iy, ir = int(x), int(y), int(self.pit_radius)
         pygame.draw.circle(self.screen, color, (ix, iy), ir)
@@ -192,13 +221,7 @@ class KalahGUI:
 
         self.btn_back.draw(self.screen, self.font_small)
         self.btn_restart.draw(self.screen, self.font_small)
-
-        current_player = player(self.state)
-        player_text = "AI Thinking..." if self.ai_thinking else (
-            "Your Turn (Player 1)" if current_player == P1 else "AI Thinking... (Player 2)"
-        )
-        status = self.font_medium.render(player_text, True, BLUE if current_player == P1 else RED)
-        self.screen.blit(status, (self.width // 2 - status.get_width() // 2, 20))
+        self.draw_status()
 
         pygame.draw.rect(self.screen, DARK_GREEN, self.board_rect, 3)
 
@@ -210,11 +233,7 @@ class KalahGUI:
                           self.board_offset_y + self.pit_spacing_y + 60))
 
         p2x, p2y = int(self.p2_store_pos[0]), int(self.p2_store_pos[1])
-        sr = int(self.store_radius)
-        pygame.draw.circle(self.screen, BROWN, (p2x, p2y), sr)
-        pygame.draw.circle(self.screen, BLACK, (p2x, p2y), sr, 3)
-        p2_score = self.font_medium.render(str(self.state.board[P2_store]), True, YELLOW)
-        self.screen.blit(p2_score, (p2x - p2_score.get_width() // 2, p2y - p2_score.get_height() // 2))
+        self.draw_store(self.p2_store_pos, P2_store)
         self.screen.blit(self.surf_ai_store_label,
                          (p2x - self.surf_ai_store_label.get_width() // 2, p2y - 100))
 
@@ -222,26 +241,48 @@ class KalahGUI:
 
         for i, pit_idx in enumerate(reversed(P2_pits)):
             x, y = self.p2_pit_positions[i]
-            self.draw_pit(x, y, pit_idx, legal_moves, is_hovered=(pit_idx == self.hovered_pit))
+            self.draw_pit(x, y, pit_idx, legal_moves)
             lbl = self.surf_pit_numbers[i]
             self.screen.blit(lbl, (x - lbl.get_width() // 2, y + 70))
 
         for i, pit_idx in enumerate(P1_pits):
             x, y = self.p1_pit_positions[i]
-            self.draw_pit(x, y, pit_idx, legal_moves, is_hovered=(pit_idx == self.hovered_pit))
+            self.draw_pit(x, y, pit_idx, legal_moves)
             lbl = self.surf_pit_numbers[i]
             self.screen.blit(lbl, (x - lbl.get_width() // 2, y + 70))
 
         p1x, p1y = int(self.p1_store_pos[0]), int(self.p1_store_pos[1])
-        pygame.draw.circle(self.screen, BROWN, (p1x, p1y), sr)
-        pygame.draw.circle(self.screen, BLACK, (p1x, p1y), sr, 3)
-        p1_score = self.font_medium.render(str(self.state.board[P1_store]), True, YELLOW)
-        self.screen.blit(p1_score, (p1x - p1_score.get_width() // 2, p1y - p1_score.get_height() // 2))
+        self.draw_store(self.p1_store_pos, P1_store)
         self.screen.blit(self.surf_p1_store_label,
                          (p1x - self.surf_p1_store_label.get_width() // 2, p1y + 75))
 
-        if self.message and self.message_timer > 0:
-            msg = self.font_small.render(self.message, True, YELLOW)
+        self.draw_message()
+
+    def _status_text(self):
+        if self.ai_thinking:
+            return "AI Thinking..."
+        return "Your Turn (Player 1)" if player(self.state) == P1 else "AI Thinking... (Player 2)"
+
+    def draw_status(self):
+        color = BLUE if player(self.state) == P1 else RED
+        status = self.font_medium.render(self._status_text(), True, color)
+        self.screen.blit(status, (self.width // 2 - status.get_width() // 2, 20))
+
+    def draw_store(self, pos, store_idx):
+        x, y = int(pos[0]), int(pos[1])
+        sr = int(self.store_radius)
+        pygame.draw.circle(self.screen, BROWN, (x, y), sr)
+        pygame.draw.circle(self.screen, BLACK, (x, y), sr, 3)
+        score = self.font_medium.render(str(self.state.board[store_idx]), True, YELLOW)
+        self.screen.blit(score, (x - score.get_width() // 2, y - score.get_height() // 2))
+
+    def _message_text(self):
+        return self.message if self.message and self.message_timer > 0 else ""
+
+    def draw_message(self):
+        text = self._message_text()
+        if text:
+            msg = self.font_small.render(text, True, YELLOW)
             self.screen.blit(msg, (self.width // 2 - msg.get_width() // 2, self.height - 60))
 
     def draw_game_over_screen(self):
@@ -295,9 +336,40 @@ class KalahGUI:
             return pit
         return None
 
-    def ai_move_thread(self):
-        self.ai_move = self.ai.choose_action(self.state)
+    # worker jobs. the worker cancels them through stop when they are replaced
+    def search_move(self, stop, ai, state):
+        return "move", state.zobrist, ai.choose_action(state, stop_event=stop)
+
+    def ponder(self, stop, ai, state, replies):
+        # most likely human moves first
+        for move in order_moves(state, actions(state)):
+            if stop.is_set():
+                return
+            child = result(state, move)
+            if terminal_test(child) or player(child) != P2 or child.zobrist in replies:
+                continue
+            reply = ai.choose_action(child, stop_event=stop)
+            if reply is not None and not stop.is_set():
+                replies[child.zobrist] = reply
+        return "ponder", state.zobrist, None
+
+    def start_ponder(self):
+        self._ponder_key = self.state.zobrist
+        self.worker.submit(self.ponder, self.ai, self.state, self._ponder_moves)
+
+    def stop_ponder(self):
+        if self._ponder_key is not None:
+            self.worker.cancel()
+        self._ponder_key = None
+
+    # new game or new AI: cancels every search, their results and pondered
+    # replies no longer apply
+    def reset_ponder(self):
+        self.worker.new_generation()
+        self._ponder_key = None
+        self._ponder_moves = {}
         self.ai_thinking = False
+        self.ai_move = None
 
     def update(self):
         self.message_timer -= 1
@@ -307,11 +379,25 @@ class KalahGUI:
 
         if terminal_test(self.state):
             self.mode = GameMode.GAME_OVER
+            self.stop_ponder()
             return
 
-        if player(self.state) == P2 and not self.ai_thinking:
-            self.ai_thinking = True
-            threading.Thread(target=self.ai_move_thread, daemon=True).start()
+        for kind, key, move in self.worker.poll():
+            if kind == "move" and key == self.state.zobrist and player(self.state) == P2:
+                self.ai_move = move
+                self.ai_thinking = False
+
+        if player(self.state) == P1:
+            if self._ponder_key != self.state.zobrist:
+                self.start_ponder()
+        elif not self.ai_thinking and self.ai_move is None:
+            self.stop_ponder()
+            reply = self._ponder_moves.get(self.state.zobrist)
+            if reply is not None:
+                self.ai_move = reply
+            else:
+                self.ai_thinking = True
+                self.worker.submit(self.search_move, self.ai, self.state)
 
         if self.ai_move is not None:
             self.state = result(self.state, self.ai_move)
@@ -323,11 +409,11 @@ class KalahGUI:
     def handle_click(self, pos):
         if self.mode == GameMode.HOME:
             if self.btn_ai_easy.is_clicked(pos):
-                self.start_game(4)
+                self.start_game(*DIFFICULTY_EASY)
             elif self.btn_ai_medium.is_clicked(pos):
-                self.start_game(6)
+                self.start_game(*DIFFICULTY_MEDIUM)
             elif self.btn_ai_hard.is_clicked(pos):
-                self.start_game(8)
+                self.start_game(*DIFFICULTY_HARD)
             elif self.btn_quit.is_clicked(pos):
                 return False
         
@@ -335,11 +421,11 @@ class KalahGUI:
             if self.btn_back.is_clicked(pos):
                 self.mode = GameMode.HOME
                 self.state = initial_state()
+                self.reset_ponder()
             elif self.btn_restart.is_clicked(pos):
                 self.state = initial_state()
-                self.ai_thinking = False
-                self.ai_move = None
                 self.selected_pit = None
+                self.reset_ponder()
             else:
                 pit = self.handle_pit_click(pos)
                 if pit is not None:
@@ -352,21 +438,21 @@ class KalahGUI:
         elif self.mode == GameMode.GAME_OVER:
             if self.btn_play_again.is_clicked(pos):
                 self.state = initial_state()
-                self.ai_thinking = False
-                self.ai_move = None
                 self.mode = GameMode.PLAYING
+                self.reset_ponder()
             elif self.btn_home.is_clicked(pos):
                 self.mode = GameMode.HOME
                 self.state = initial_state()
+                self.reset_ponder()
         
         return True
 
-    def start_game(self, depth):
+    def start_game(self, depth, time_limit=None):
         self.state = initial_state()
-        self.ai = AlphaBetaPlayer(P2, max_depth=depth, eval_func="weighted")
+        self.reset_ponder()
+        self.ai = AlphaBetaPlayer(P2, max_depth=depth, eval_func="weighted",
+                                  time_limit=time_limit)
         self.mode = GameMode.PLAYING
-        self.ai_thinking = False
-        self.ai_move = None
         self.selected_pit = None
         self.message = ""
 
@@ -388,20 +474,93 @@ class KalahGUI:
             else:
                 self.hovered_pit = None
 
-    def draw(self):
+    def _button_region(self, button):
+        return button.hover, button.rect, lambda: button.draw(self.screen, self.font_medium)
+
+    # {name: (what it shows, rect, draw function)} for every part of the screen
+    # that changes without a change of mode. a region is redrawn when what it
+    # shows differs from the last time it was drawn
+    def _regions(self):
         if self.mode == GameMode.HOME:
-            self.draw_home_screen()
-        elif self.mode == GameMode.PLAYING:
-            self.draw_board()
-        elif self.mode == GameMode.GAME_OVER:
-            self.draw_game_over_screen()
-        
-        pygame.display.flip()
+            buttons = (self.btn_ai_easy, self.btn_ai_medium, self.btn_ai_hard, self.btn_quit)
+            return {id(b): self._button_region(b) for b in buttons}
+        if self.mode == GameMode.GAME_OVER:
+            return {id(b): self._button_region(b) for b in (self.btn_play_again, self.btn_home)}
+
+        regions = {
+            id(b): (b.hover, b.rect, lambda b=b: b.draw(self.screen, self.font_small))
+            for b in (self.btn_back, self.btn_restart)
+        }
+        regions["status"] = (
+            (self._status_text(), player(self.state)),
+            pygame.Rect(self.btn_back.rect.right + 10, 10,
+                        self.btn_restart.rect.left - self.btn_back.rect.right - 20, 40),
+            self.draw_status)
+        regions["message"] = (self._message_text(), pygame.Rect(0, self.height - 65, self.width, 30),
+                              self.draw_message)
+        legal_moves = self._get_legal_moves()
+        pits = list(zip(reversed(P2_pits), self.p2_pit_positions)) + list(zip(P1_pits, self.p1_pit_positions))
+        r = self.pit_radius + 2
+        for pit_idx, (x, y) in pits:
+            regions[pit_idx] = (
+                (self.state.board[pit_idx], self._pit_color(pit_idx, legal_moves)),
+                pygame.Rect(int(x) - r, int(y) - r, 2 * r, 2 * r),
+                lambda x=x, y=y, pit_idx=pit_idx: self.draw_pit(x, y, pit_idx, legal_moves))
+        r = self.store_radius + 2
+        for store_idx, (x, y) in ((P1_store, self.p1_store_pos), (P2_store, self.p2_store_pos)):
+            regions[store_idx] = (
+                self.state.board[store_idx],
+                pygame.Rect(int(x) - r, int(y) - r, 2 * r, 2 * r),
+                lambda pos=(x, y), store_idx=store_idx: self.draw_store(pos, store_idx))
+        return regions
+
+    # redraws only the regions that changed and updates just those rectangles
+    # of the display, or everything after a change of mode. returns whether
+    # anything was drawn
+    def draw(self):
+        regions = self._regions()
+        if self.mode != self._drawn_mode:
+            if self.mode == GameMode.HOME:
+                self.draw_home_screen()
+            elif self.mode == GameMode.PLAYING:
+                self.draw_board()
+            elif self.mode == GameMode.GAME_OVER:
+                self.draw_game_over_screen()
+            pygame.display.flip()
+            self._drawn_mode = self.mode
+            self._drawn = {name: shown for name, (shown, _, _) in regions.items()}
+            return True
+
+        dirty = []
+        for name, (shown, rect, draw) in regions.items():
+            if self._drawn.get(name) == shown:
+                continue
+            # the board background under the region, then its content on top
+            if self.mode == GameMode.PLAYING:
+                self.screen.set_clip(rect)
+                self.screen.fill(GREEN)
+                pygame.draw.rect(self.screen, DARK_GREEN, self.board_rect, 3)
+                draw()
+                self.screen.set_clip(None)
+            else:
+                draw()
+            self._drawn[name] = shown
+            dirty.append(rect)
+        if dirty:
+            pygame.display.update(dirty)
+        return bool(dirty)
 
     def run(self):
         running = True
+        last_active = pygame.time.get_ticks()
         while running:
-            for event in pygame.event.get():
+            if pygame.time.get_ticks() - last_active > IDLE_AFTER_MS:
+                # idle: sleep until input, a finished search or the timeout
+                event = pygame.event.wait(IDLE_WAIT_MS)
+                events = [event] + pygame.event.get() if event.type != pygame.NOEVENT else []
+            else:
+                events = pygame.event.get()
+            for event in events:
                 if event.type == pygame.QUIT:
                     running = False
                 elif event.type == pygame.MOUSEBUTTONDOWN:
@@ -409,11 +568,16 @@ class KalahGUI:
                         running = False
                 elif event.type == pygame.MOUSEMOTION:
                     self.handle_motion(event.pos)
-            
+                elif event.type == pygame.WINDOWEXPOSED:
+                    # the window lost its pixels, e.g. restored from minimized
+                    self._drawn_mode = None
+
             self.update()
-            self.draw()
-            self.clock.tick(60)
+            if self.draw() or events:
+                last_active = pygame.time.get_ticks()
+            self.clock.tick(FPS)
         
+        self.worker.close()
         pygame.quit()
         sys.exit()
 
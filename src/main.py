@@ -4,6 +4,8 @@ from game_engine import (
 )
 from minmax_pruning import AlphaBetaPlayer
 from evaluation import EVAL_FUNCTIONS
+from search_stats import JsonLinesSink
+import argparse
 
 def display(state):
     b = state.board
@@ -45,17 +47,25 @@ def get_human_action(state):
             print("  Please enter a number.")
 
 
-def play_game(mode="human_vs_ai", ai_depth=8, ai_eval="weighted"):
+# ai_time: seconds per AI move, the search then deepens iteratively up to ai_depth.
+# stats_log: file to append the AI's per-move search statistics to, as JSON lines.
+# cache: persistent search cache file, kept between sessions
+def play_game(mode="human_vs_ai", ai_depth=8, ai_eval="weighted", ai_time=None,
+              stats_log=None, cache=None):
     state = initial_state()
     move_count = 0
+    on_stats = JsonLinesSink(stats_log, mode=mode) if stats_log else None
 
     if mode == "human_vs_ai":
-        ai = AlphaBetaPlayer(P2, max_depth=ai_depth, eval_func=ai_eval)
+        ai = AlphaBetaPlayer(P2, max_depth=ai_depth, eval_func=ai_eval, time_limit=ai_time,
+                             on_stats=on_stats, cache_path=cache)
         print(f"\n  You play as Player 1 (bottom), AI is Player 2 (top).")
         print(f"  depth: {ai_depth}, eval: {ai_eval}\n")
     elif mode == "ai_vs_ai":
-        ai1 = AlphaBetaPlayer(P1, max_depth=ai_depth, eval_func=ai_eval)
-        ai2 = AlphaBetaPlayer(P2, max_depth=ai_depth, eval_func=ai_eval)
+        ai1 = AlphaBetaPlayer(P1, max_depth=ai_depth, eval_func=ai_eval, time_limit=ai_time,
+                              on_stats=on_stats, cache_path=cache)
+        ai2 = AlphaBetaPlayer(P2, max_depth=ai_depth, eval_func=ai_eval, time_limit=ai_time,
+                              on_stats=on_stats, cache_path=cache)
         print(f"\n  AI vs AI — depth: {ai_depth}, eval: {ai_eval}\n")
 
     while not terminal_test(state):
@@ -99,8 +109,16 @@ def play_game(mode="human_vs_ai", ai_depth=8, ai_eval="weighted"):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kalaha in the terminal")
+    parser.add_argument("--stats-log", default=None,
+                        help="append the AI's per-move search statistics as JSON lines to this file")
+    parser.add_argument("--cache", default=None,
+                        help="persistent search cache file, reused by later sessions")
+    args = parser.parse_args()
+
     print("\n" + "=" * 40)
     print("         KALAHA")
     print("=" * 40)
 
-    play_game(mode="human_vs_ai", ai_depth=8, ai_eval="weighted")
\ No newline at end of file
+    play_game(mode="human_vs_ai", ai_depth=8, ai_eval="weighted", stats_log=args.stats_log,
+              cache=args.cache)
\ No newline at end of file
@@ -0,0 +1,149 @@
+# micro-benchmarks for the engine hot paths: times actions, result, make/unmake,
+# terminal_test, every evaluator and a fixed-depth search on the same fixed
+# positions, a few repeats each, and reports the mean rate with its spread.
+# results can be saved as a baseline JSON file and later runs compared to it.
+#
+# run from the src directory with:  python benchmark.py --micro [--save-baseline]
+import json
+import platform
+import statistics
+import time
+
+from game_engine import actions, result, terminal_test, make_move, unmake_move
+from evaluation import EVAL_FUNCTIONS
+from minmax_pruning import AlphaBetaPlayer
+
+
+# runs fn `repeats` times, each timing one pass over the work that fn does.
+# fn returns how many operations it did. setup, if given, runs untimed before
+# every repeat and its result is passed to fn. returns the rate of every repeat
+def _rates(fn, repeats, setup=None):
+    rates = []
+    for _ in range(repeats):
+        args = (setup(),) if setup is not None else ()
+        start = time.perf_counter()
+        ops = fn(*args)
+        rates.append(ops / (time.perf_counter() - start))
+    return rates
+
+
+def _hot_paths(positions, loops):
+    moves = [(s, a) for s in positions for a in actions(s)]
+    mutable = [(s.copy(), actions(s)) for s in positions]
+
+    def bench_actions():
+        for _ in range(loops):
+            for s in positions:
+                actions(s)
+        return loops * len(positions)
+
+    def bench_result():
+        for _ in range(loops):
+            for s, a in moves:
+                result(s, a)
+        return loops * len(moves)
+
+    def bench_make_unmake():
+        n = 0
+        for _ in range(loops):
+            for s, legal in mutable:
+                for a in legal:
+                    unmake_move(s, make_move(s, a))
+                n += len(legal)
+        return n
+
+    def bench_terminal_test():
+        for _ in range(loops):
+            for s in positions:
+                terminal_test(s)
+        return loops * len(positions)
+
+    paths = {
+        "actions": bench_actions,
+        "result": bench_result,
+        "make_unmake": bench_make_unmake,
+        "terminal_test": bench_terminal_test,
+    }
+    for name, eval_fn in EVAL_FUNCTIONS.items():
+        def bench_eval(eval_fn=eval_fn):
+            for _ in range(loops):
+                for s in positions:
+                    eval_fn(s, s.current_player)
+            return loops * len(positions)
+        paths[f"eval_{name}"] = bench_eval
+    return paths
+
+
+# nodes per second of a fresh fixed-depth player on every position. the players
+# (and their transposition tables) are built outside the timed part
+def _search(positions, depth):
+    def setup():
+        return [AlphaBetaPlayer(s.current_player, max_depth=depth, tt_size_log2=16)
+                for s in positions]
+
+    def bench_search(searchers):
+        nodes = 0
+        for s, searcher in zip(positions, searchers):
+            searcher.choose_action(s)
+            nodes += searcher.nodes_explored
+        return nodes
+    return bench_search, setup
+
+
+# {name: {"mean", "stdev", "best", "unit"}} for every hot path and the search
+def run_microbenchmarks(positions, repeats=5, loops=200, search_depth=6):
+    results = {}
+    benches = [(name, fn, None, "ops/s") for name, fn in _hot_paths(positions, loops).items()]
+    benches.append((f"search_d{search_depth}", *_search(positions, search_depth), "nodes/s"))
+
+    for name, fn, setup, unit in benches:
+        # one untimed run to warm up caches and the allocator
+        fn(*((setup(),) if setup is not None else ()))
+        rates = _rates(fn, repeats, setup)
+        results[name] = {
+            "mean": statistics.mean(rates),
+            "stdev": statistics.stdev(rates) if len(rates) > 1 else 0.0,
+            "best": max(rates),
+            "unit": unit,
+        }
+    return results
+
+
+def print_results(results):
+    print(f"\n  {'benchmark':<20} {'mean':>14} {'':<8} {'stdev':>7} {'best':>14}")
+    for name, r in results.items():
+        spread = r["stdev"] / r["mean"] * 100 if r["mean"] else 0.0
+        print(f"  {name:<20} {r['mean']:>14,.0f} {r['unit']:<8} {spread:>6.1f}% {r['best']:>14,.0f}")
+
+
+def save_baseline(path, results):
+    data = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+# names whose best rate dropped by more than `threshold` (a fraction) against the
+# baseline. the best repeat is the one least disturbed by other load on the
+# machine, so it is compared rather than the mean. prints one line per benchmark
+# found in both
+def compare_to_baseline(path, results, threshold=0.10):
+    with open(path) as f:
+        baseline = json.load(f)["results"]
+
+    regressions = []
+    print(f"\n  {'benchmark':<20} {'baseline':>14} {'now':>14} {'change':>8}")
+    for name, r in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["best"]
+        change = (r["best"] - before) / before
+        flag = ""
+        if change < -threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"  {name:<20} {before:>14,.0f} {r['best']:>14,.0f} {change * 100:>+7.1f}%{flag}")
+    return regressions
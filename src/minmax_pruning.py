@@ -1,102 +1,753 @@
 from game_engine import (
     GameState, P1, P2, P1_pits, P2_pits, P1_store, P2_store,
     actions, result, terminal_test, utility, score, player,
-    opposite_pit
+    opposite_pit, make_move, unmake_move, move_kind, EXTRA_TURN, CAPTURE
 )
 
 from evaluation import (
     evaluate_score_difference, eval_weighted, EVAL_FUNCTIONS, eval_positional
 )
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
 
 import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
 
 
-# orders moves so the search tries the most promising ones first
-def order_moves(state, legal_moves):
-    current_player = state.current_player
+# orders moves so the search tries the most promising ones first.
+# killers: moves that caused a cutoff at this ply, tried after captures.
+# history: cutoff scores per pit for the side to move, breaks ties within each group
+def order_moves(state, legal_moves, killers=None, history=None):
     board = state.board
-    own_store = P1_store if current_player == P1 else P2_store
-    own_pits = P1_pits if current_player == P1 else P2_pits
+
+    if history is not None:
+        # stable sort, so equal scores keep board order. the groups below keep this order
+        legal_moves = sorted(legal_moves, key=history.__getitem__, reverse=True)
 
     extra_turn_moves = []
     capture_moves = []
+    killer_moves = []
     other_moves = []
 
     for move in legal_moves:
-        stones = board[move]
-        last_pos = (move + stones) % 14
+        kind = move_kind(board, move)
 
-        if last_pos == own_store:
+        if kind == EXTRA_TURN:
             extra_turn_moves.append(move)
-        elif last_pos in own_pits and board[last_pos] == 0 and board[opposite_pit(last_pos)] > 0:
+        elif kind == CAPTURE:
             capture_moves.append(move)
+        elif killers is not None and move in killers:
+            killer_moves.append(move)
         else:
             other_moves.append(move)
 
-    return extra_turn_moves + capture_moves + other_moves
+    if len(killer_moves) == 2 and killer_moves[0] != killers[0]:
+        killer_moves.reverse()
+
+    return extra_turn_moves + capture_moves + killer_moves + other_moves
+
+
+# the moves quiescence keeps searching past the horizon: the ones ending in the
+# mover's store (extra turn) or capturing, in board order
+def tactical_moves(state):
+    board = state.board
+    return [move for move in actions(state) if move_kind(board, move)]
+
+
+# puts the transposition table's best move in front of the ordered moves
+def tt_first(moves, tt_move):
+    if tt_move is not None and tt_move in moves and moves[0] != tt_move:
+        moves.remove(tt_move)
+        moves.insert(0, tt_move)
+    return moves
+
+
+# raised inside the search when the time budget runs out
+class SearchTimeout(Exception):
+    pass
+
+
+# how many nodes between clock checks
+TIME_CHECK_INTERVAL = 1024
+# seconds between clock and stop checks while the parallel root waits for a worker
+WORKER_POLL_INTERVAL = 0.01
+WIN_SCORE = 10000
+# "static": extra turn, capture, then board order
+# "history": the same groups plus killer moves and the history table
+ORDERINGS = ("static", "history")
+# "alphabeta": full window at every node
+# "pvs": full window for the first move, null windows to prove the others worse
+# "mtdf": only null-window searches from the root, converging on the value
+ALGORITHMS = ("alphabeta", "pvs", "mtdf")
 
 
 class AlphaBetaPlayer:
-    def __init__(self, player_id, max_depth=8, eval_func="weighted"):
+    def __init__(self, player_id, max_depth=8, eval_func="weighted", tt_size_log2=20,
+                 time_limit=None, batch_leaves=False, workers=1, endgame_path=None,
+                 book_path=None, ordering="history", algorithm="alphabeta",
+                 quiescence_depth=0, on_stats=None, cache_path=None, cache_min_depth=4,
+                 cache_max_entries=1_000_000):
+        if ordering not in ORDERINGS:
+            raise ValueError(f"unknown move ordering {ordering!r}, expected one of {ORDERINGS}")
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"unknown search algorithm {algorithm!r}, expected one of {ALGORITHMS}")
+        if algorithm == "mtdf" and (tt_size_log2 is None or workers > 1):
+            # every pass relies on the table to not redo the previous ones, and the
+            # parallel root only knows how to search with an open upper bound
+            raise ValueError("mtdf needs the transposition table and workers=1")
         self.player_id = player_id
         self.max_depth = max_depth
         self.eval_fn = EVAL_FUNCTIONS[eval_func]
         self.eval_func_name = eval_func
         self.nodes_explored = 0
+        # at the horizon, keep playing captures and extra turns up to this many
+        # moves deep before evaluating (0 = off). its nodes are also counted in
+        # nodes_explored
+        self.quiescence_depth = quiescence_depth
+        self.quiescence_nodes = 0
+        # cheap counters kept on every search, the rest of SearchStats is only
+        # gathered when on_stats is set. the cutoff, eval and leaf counters cover
+        # this process, subtrees searched by workers only show up in the nodes.
+        # leaves are the nodes scored without searching further: terminal,
+        # endgame table, static eval and quiescence stand-pat
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.eval_calls = 0
+        self.leaves = 0
+        self._iteration_nodes = {}
+        # on_stats(SearchStats) is called after every choose_action, e.g. with a
+        # search_stats.JsonLinesSink
+        self.on_stats = on_stats
+        # kept for the whole game, tt_size_log2=None turns it off
+        self.tt = TranspositionTable(tt_size_log2) if tt_size_log2 is not None else None
+        # seconds per move; with a limit the search deepens iteratively up to max_depth
+        self.time_limit = time_limit
+        self.depth_reached = 0
+        # root value of the last move chosen, from this player's side. None for a
+        # book move or a search stopped before it finished an iteration
+        self.last_value = None
+        self._deadline = None
+        self._stop_event = None
+        # evaluate all children of a depth-1 node in one numpy call (needs numpy)
+        self.batch_eval_fn = None
+        if batch_leaves:
+            from batch_eval import batch_eval_function
+            self.batch_eval_fn = batch_eval_function(eval_func)
+        # exact endgame results, the file is only opened on the first probe
+        self.endgame = None
+        if endgame_path is not None:
+            from endgame import EndgameTable
+            self.endgame = EndgameTable(endgame_path)
+        # opening moves from disk, also opened on first use
+        self.book = None
+        if book_path is not None:
+            from opening_book import OpeningBook
+            self.book = OpeningBook(book_path)
+        # killers[ply] holds the last two moves that cut off at that ply, cleared
+        # every move. history[player][pit] adds depth^2 on every cutoff and is
+        # halved every move, so older searches fade out
+        self.ordering = ordering
+        self.killers = []
+        self.history = [[0] * 14, [0] * 14]
+        self._root_depth = 0
+        self._root_rank = {}
+        self.algorithm = algorithm
+        self._pvs = algorithm != "alphabeta"
+        # results of nodes searched at least cache_min_depth deep are kept on disk
+        # and shared with other players, processes and later runs
+        self.cache = None
+        self.cache_min_depth = cache_min_depth
+        if cache_path is not None:
+            from search_cache import SearchCache, search_context
+            context = search_context(eval_func, self.eval_fn, quiescence_depth, endgame_path)
+            self.cache = SearchCache(cache_path, context, cache_max_entries)
+        # workers > 1 searches the root moves in a process pool, see _search_root_parallel
+        self.workers = workers
+        self._pool = None
+        # set to stop the searches running in the pool
+        self._cancel = None
+        # what a worker process needs to build an equivalent player
+        self._worker_config = dict(player_id=player_id, max_depth=max_depth,
+                                   eval_func=eval_func, tt_size_log2=tt_size_log2,
+                                   batch_leaves=batch_leaves, endgame_path=endgame_path,
+                                   ordering=ordering, algorithm=algorithm,
+                                   quiescence_depth=quiescence_depth, cache_path=cache_path,
+                                   cache_min_depth=cache_min_depth,
+                                   cache_max_entries=cache_max_entries)
 
-    def choose_action(self, state):
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+            self._cancel = None
+        if self.cache is not None:
+            self.cache.close()
+
+    # stop_event: a threading.Event, setting it aborts the search. a stopped
+    # fixed-depth search returns None, a stopped iterative one the move of the
+    # deepest finished iteration (None if there was none)
+    def choose_action(self, state, time_limit=None, stop_event=None):
+        if self.on_stats is None:
+            return self._choose_action(state, time_limit, stop_event)
+
+        from search_stats import SearchStats
+        tt = self.tt
+        tt_hits, tt_probes = (tt.hits, tt.probes) if tt is not None else (0, 0)
+        cache = self.cache
+        cache_hits, cache_probes = (cache.hits, cache.probes) if cache is not None else (0, 0)
+        endgame_hits = self.endgame.hits if self.endgame is not None else 0
+        book_hits = self.book.hits if self.book is not None else 0
+        start = time.perf_counter()
+        move = self._choose_action(state, time_limit, stop_event)
+
+        stats = SearchStats(
+            player_id=self.player_id,
+            move=move,
+            depth_reached=self.depth_reached,
+            wall_time=time.perf_counter() - start,
+            nodes=self.nodes_explored,
+            nodes_by_depth=dict(self._iteration_nodes),
+            quiescence_nodes=self.quiescence_nodes,
+            eval_calls=self.eval_calls,
+            leaves=self.leaves,
+            cutoffs=self.cutoffs,
+            first_move_cutoffs=self.first_move_cutoffs,
+            tt_probes=tt.probes - tt_probes if tt is not None else 0,
+            tt_hits=tt.hits - tt_hits if tt is not None else 0,
+            cache_probes=cache.probes - cache_probes if cache is not None else 0,
+            cache_hits=cache.hits - cache_hits if cache is not None else 0,
+            endgame_hits=self.endgame.hits - endgame_hits if self.endgame is not None else 0,
+            book_hit=self.book is not None and self.book.hits > book_hits,
+        )
+        self.on_stats(stats.finish())
+        return move
+
+    def _choose_action(self, state, time_limit, stop_event):
         self.nodes_explored = 0
+        self.quiescence_nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.eval_calls = 0
+        self.leaves = 0
+        self._iteration_nodes = {}
+        self.last_value = None
+        if self.book is not None:
+            move = self.book.lookup(state)
+            if move is not None and move in actions(state):
+                self.depth_reached = 0
+                return move
+        # the search makes and unmakes moves on one private mutable board
+        state = GameState(list(state.board), state.current_player, state.zobrist)
+        if self.tt is not None:
+            self.tt.new_search()
+        self._age_ordering()
+        if time_limit is None:
+            time_limit = self.time_limit
+
+        self._stop_event = stop_event
+        try:
+            if time_limit is None:
+                self.depth_reached = self.max_depth
+                legal_moves = order_moves(state, actions(state))
+                try:
+                    best_action, value, _ = self._search_root(state, self.max_depth, legal_moves)
+                except SearchTimeout:
+                    self.depth_reached = 0
+                    return None
+                self.last_value = value
+                self._iteration_nodes[self.max_depth] = self.nodes_explored
+                return best_action
+            return self._iterative_deepening(state, time_limit)
+        finally:
+            self._stop_event = None
+            if self.cache is not None:
+                self.cache.flush()
+
+    def _age_ordering(self):
+        self.killers = [[None, None] for _ in range(self.max_depth + 1)]
+        for row in self.history:
+            for pit in range(14):
+                row[pit] >>= 1
 
+    # killer slots and history scores to order a node's moves with, or (None, None)
+    def _ordering_tables(self, state, depth):
+        if self.ordering == "static":
+            return None, None
+        return self.killers[self._root_depth - depth], self.history[state.current_player]
+
+    def _record_cutoff(self, state, action, depth):
+        if self.ordering == "static":
+            return
+        self.history[state.current_player][action] += depth * depth
+        slots = self.killers[self._root_depth - depth]
+        if slots[0] != action:
+            slots[1] = slots[0]
+            slots[0] = action
+
+    def _out_of_time(self):
+        if self._stop_event is not None and self._stop_event.is_set():
+            return True
+        return self._deadline is not None and time.perf_counter() > self._deadline
+
+    def _iterative_deepening(self, state, time_limit):
+        deadline = time.perf_counter() + time_limit
+        root_moves = order_moves(state, actions(state))
         best_action = None
-        best_value = -math.inf
+        self.depth_reached = 0
 
-        legal_moves = actions(state)
-        legal_moves = order_moves(state, legal_moves)
+        try:
+            for depth in range(1, self.max_depth + 1):
+                # depth 1 ignores the clock so there is a move to fall back on
+                self._deadline = deadline if depth > 1 else None
+                nodes_before = self.nodes_explored
+                action, value, values = self._search_root(state, depth, root_moves)
+                best_action = action
+                self.depth_reached = depth
+                self.last_value = value
+                self._iteration_nodes[depth] = self.nodes_explored - nodes_before
+
+                # next iteration tries the moves in order of this iteration's scores
+                root_moves = sorted(root_moves, key=lambda a: values[a], reverse=True)
+
+                if abs(value) >= WIN_SCORE or time.perf_counter() >= deadline:
+                    break
+        except SearchTimeout:
+            pass
+        finally:
+            self._deadline = None
+
+        return best_action
+
+    def _search_root(self, state, depth, root_moves):
+        tt = self.tt
+        tt_move = None
+        entry = self._probe(state, depth)
+        if entry is not None:
+            tt_move = entry[4]
+
+        legal_moves = tt_first(list(root_moves), tt_move)
+        self._root_depth = depth
+        # ties between root moves go to the earlier move in the static order, not
+        # the search order, which depends on the tables of whoever searched it
+        self._root_rank = {a: k for k, a in enumerate(order_moves(state, list(root_moves)))}
+
+        if self.algorithm == "mtdf":
+            # first guess: the previous iteration's (or previous move's) root value
+            if entry is not None:
+                guess = entry[2]
+            else:
+                self.eval_calls += 1
+                guess = self.eval_fn(state, self.player_id)
+            best_action, best_value, values = self._mtdf(state, depth, legal_moves, guess)
+        elif self.workers > 1 and len(legal_moves) > 1 and depth > 1:
+            best_action, best_value, values = self._search_root_parallel(state, depth, legal_moves)
+        else:
+            best_action, best_value, values = self._search_root_window(
+                state, depth, legal_moves, -math.inf, math.inf)
+
+        if tt is not None:
+            tt.store(state.zobrist, depth, best_value, EXACT, best_action)
+        if self.cache is not None:
+            self.cache.put(state.zobrist, self.player_id, depth, best_value, EXACT, best_action)
 
-        alpha = -math.inf
-        beta = math.inf
+        return best_action, best_value, values
 
-        for action in legal_moves:
-            child = result(state, action)
-            value = self._min_max(child, self.max_depth - 1, alpha, beta)
+    # transposition table entry for the state, falling back to the disk cache when
+    # the table has nothing as deep as `depth`. disk entries are copied into the table
+    def _probe(self, state, depth):
+        tt = self.tt
+        entry = tt.probe(state.zobrist) if tt is not None else None
+        if (self.cache is not None and depth >= self.cache_min_depth
+                and (entry is None or entry[1] < depth)):
+            cached = self.cache.probe(state.zobrist, self.player_id)
+            if cached is not None and (entry is None or cached[1] > entry[1]):
+                entry = cached
+                if tt is not None:
+                    tt.store(state.zobrist, cached[1], cached[2], cached[3], cached[4])
+        return entry
 
-            if value > best_value:
+    # fail-soft search of the root moves in the window (alpha, beta). the values
+    # of moves that did not raise alpha are only upper bounds. a move that comes
+    # before the best one in the static order is searched with alpha one ulp
+    # lower, so a tie with the best move is an exact value and wins
+    def _search_root_window(self, state, depth, legal_moves, alpha, beta):
+        best_action = None
+        best_value = -math.inf
+        values = {}
+        rank = self._root_rank
+
+        for k, action in enumerate(legal_moves):
+            a = alpha
+            if best_action is not None and alpha == best_value and rank[action] < rank[best_action]:
+                a = math.nextafter(alpha, -math.inf)
+            undo = make_move(state, action)
+            if self._pvs and k:
+                value = self._min_max(state, depth - 1, a, math.nextafter(a, math.inf))
+                if a < value < beta:
+                    value = self._min_max(state, depth - 1, a, beta)
+            else:
+                value = self._min_max(state, depth - 1, a, beta)
+            unmake_move(state, undo)
+            values[action] = value
+
+            if value > best_value or (value == best_value and value > a
+                                      and rank[action] < rank[best_action]):
                 best_value = value
                 best_action = action
 
             alpha = max(alpha, value)
+            if alpha >= beta:
+                break
 
-        return best_action
+        return best_action, best_value, values
+
+    # mtd(f): null-window root searches around the guess g. a pass that fails high
+    # proves value >= g and gives a best move, one that fails low proves value <= g.
+    # the scores are floats, so the null window is (beta - one ulp, beta).
+    def _mtdf(self, state, depth, legal_moves, g):
+        lower, upper = -math.inf, math.inf
+        best_action = legal_moves[0]
+        values = {}
+
+        while lower < upper:
+            beta = math.nextafter(g, math.inf) if g == lower else g
+            action, g, pass_values = self._search_root_window(
+                state, depth, legal_moves, math.nextafter(beta, -math.inf), beta)
+            values.update(pass_values)
+            if g < beta:
+                upper = g
+            else:
+                lower = g
+                best_action = action
+                legal_moves = tt_first(list(legal_moves), action)
+
+        return best_action, g, values
+
+    # young brothers wait: the first (best ordered) move is searched here to get a
+    # bound, then the other moves are searched in parallel with that alpha. moves
+    # before the first one in the static order get alpha one ulp lower, so ties
+    # are broken by the static order exactly as in the serial loop. while it waits
+    # for the workers it checks the clock and the stop event, and stops them too.
+    def _search_root_parallel(self, state, depth, legal_moves):
+        first, rest = legal_moves[0], legal_moves[1:]
+        undo = make_move(state, first)
+        alpha = self._min_max(state, depth - 1, -math.inf, math.inf)
+        unmake_move(state, undo)
+
+        best_action, best_value = first, alpha
+        values = {first: alpha}
+
+        if self._pool is None:
+            self._cancel = multiprocessing.Event()
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(self._cancel,))
+        time_left = None
+        if self._deadline is not None:
+            time_left = self._deadline - time.perf_counter()
+        board = list(state.board)
+        rank = self._root_rank
+        lowered = math.nextafter(alpha, -math.inf)
+        windows = [lowered if rank[action] < rank[first] else alpha for action in rest]
+        futures = [
+            self._pool.submit(_search_subtree, self._worker_config, board,
+                              state.current_player, action, depth, a, time_left)
+            for action, a in zip(rest, windows)
+        ]
+
+        for action, a, future in zip(rest, windows, futures):
+            while not future.done():
+                if self._out_of_time():
+                    self._stop_workers(futures)
+                    raise SearchTimeout
+                wait([future], timeout=WORKER_POLL_INTERVAL)
+            value, nodes, quiescence_nodes = future.result()
+            self.nodes_explored += nodes
+            self.quiescence_nodes += quiescence_nodes
+            if value is None:
+                self._stop_workers(futures)
+                raise SearchTimeout
+            values[action] = value
+            # values not above their alpha are upper bounds and never win a tie
+            if value > best_value or (value == best_value and value > a
+                                      and rank[action] < rank[best_action]):
+                best_value = value
+                best_action = action
+
+        return best_action, best_value, values
+
+    # cancels the queued searches and stops the running ones. waits for them, so
+    # none of them still sees the cancel event when it is cleared for the next search
+    def _stop_workers(self, futures):
+        self._cancel.set()
+        for f in futures:
+            f.cancel()
+        wait(futures)
+        self._cancel.clear()
 
     def _min_max(self, state, depth, alpha, beta):
         self.nodes_explored += 1
+        if not self.nodes_explored % TIME_CHECK_INTERVAL and self._out_of_time():
+            raise SearchTimeout
 
         if terminal_test(state):
+            self.leaves += 1
             u = utility(state, self.player_id)
-            return u * 10000
+            return u * WIN_SCORE
+
+        if self.endgame is not None:
+            margin = self.endgame.probe(state)
+            if margin is not None:
+                self.leaves += 1
+                return self._endgame_score(state, margin)
 
         if depth <= 0:
+            if self.quiescence_depth:
+                return self._quiesce(state, alpha, beta, self.quiescence_depth)
+            self.eval_calls += 1
+            self.leaves += 1
             return self.eval_fn(state, self.player_id)
 
+        # the batched frontier evaluates leaves statically, so not with quiescence
+        if depth == 1 and self.batch_eval_fn is not None and not self.quiescence_depth:
+            return self._frontier(state, alpha, beta)
+
+        tt = self.tt
+        tt_move = None
+        entry = self._probe(state, depth) if self.cache is not None else (
+            tt.probe(state.zobrist) if tt is not None else None)
+        if entry is not None:
+            tt_move = entry[4]
+            if entry[1] >= depth:
+                tt_value, flag = entry[2], entry[3]
+                if flag == EXACT:
+                    return tt_value
+                if flag == LOWER:
+                    alpha = max(alpha, tt_value)
+                else:
+                    beta = min(beta, tt_value)
+                if alpha >= beta:
+                    return tt_value
+        alpha_orig, beta_orig = alpha, beta
+
+        killers, history = self._ordering_tables(state, depth)
         legal_moves = actions(state)
-        legal_moves = order_moves(state, legal_moves)
+        legal_moves = tt_first(order_moves(state, legal_moves, killers, history), tt_move)
         is_maximizing = (player(state) == self.player_id)
+        best_move = None
 
+        # pvs: after the first move, a null window only asks whether a move beats
+        # the bound so far. the rare move that does is searched again in full
+        pvs = self._pvs
         if is_maximizing:
             value = -math.inf
-            for action in legal_moves:
-                child = result(state, action)
-                value = max(value, self._min_max(child, depth - 1, alpha, beta))
+            for k, action in enumerate(legal_moves):
+                undo = make_move(state, action)
+                if pvs and k:
+                    child_value = self._min_max(state, depth - 1, alpha,
+                                                math.nextafter(alpha, math.inf))
+                    if alpha < child_value < beta:
+                        child_value = self._min_max(state, depth - 1, alpha, beta)
+                else:
+                    child_value = self._min_max(state, depth - 1, alpha, beta)
+                unmake_move(state, undo)
+                if child_value > value:
+                    value = child_value
+                    best_move = action
                 alpha = max(alpha, value)
                 if alpha >= beta:
+                    self.cutoffs += 1
+                    if not k:
+                        self.first_move_cutoffs += 1
+                    self._record_cutoff(state, action, depth)
                     break
-            return value
         else:
             value = math.inf
-            for action in legal_moves:
-                child = result(state, action)
-                value = min(value, self._min_max(child, depth - 1, alpha, beta))
+            for k, action in enumerate(legal_moves):
+                undo = make_move(state, action)
+                if pvs and k:
+                    child_value = self._min_max(state, depth - 1,
+                                                math.nextafter(beta, -math.inf), beta)
+                    if alpha < child_value < beta:
+                        child_value = self._min_max(state, depth - 1, alpha, beta)
+                else:
+                    child_value = self._min_max(state, depth - 1, alpha, beta)
+                unmake_move(state, undo)
+                if child_value < value:
+                    value = child_value
+                    best_move = action
                 beta = min(beta, value)
                 if alpha >= beta:
+                    self.cutoffs += 1
+                    if not k:
+                        self.first_move_cutoffs += 1
+                    self._record_cutoff(state, action, depth)
+                    break
+
+        if value <= alpha_orig:
+            flag = UPPER
+        elif value >= beta_orig:
+            flag = LOWER
+        else:
+            flag = EXACT
+        if tt is not None:
+            tt.store(state.zobrist, depth, value, flag, best_move)
+        if self.cache is not None and depth >= self.cache_min_depth:
+            self.cache.put(state.zobrist, self.player_id, depth, value, flag, best_move)
+
+        return value
+
+    # quiescence: the static eval is the stand-pat score, since the side to move
+    # can always decline to capture. only captures and extra turns are tried, and
+    # at most `depth` of them in a row
+    def _quiesce(self, state, alpha, beta, depth):
+        self.eval_calls += 1
+        stand_pat = self.eval_fn(state, self.player_id)
+        if depth <= 0:
+            self.leaves += 1
+            return stand_pat
+        moves = tactical_moves(state)
+        if not moves:
+            self.leaves += 1
+            return stand_pat
+
+        is_maximizing = (player(state) == self.player_id)
+        if is_maximizing:
+            if stand_pat >= beta:
+                self.leaves += 1
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+        else:
+            if stand_pat <= alpha:
+                self.leaves += 1
+                return stand_pat
+            beta = min(beta, stand_pat)
+
+        value = stand_pat
+        for action in moves:
+            self.nodes_explored += 1
+            self.quiescence_nodes += 1
+            if not self.nodes_explored % TIME_CHECK_INTERVAL and self._out_of_time():
+                raise SearchTimeout
+
+            undo = make_move(state, action)
+            if terminal_test(state):
+                self.leaves += 1
+                child_value = utility(state, self.player_id) * WIN_SCORE
+            else:
+                child_value = self._quiesce(state, alpha, beta, depth - 1)
+            unmake_move(state, undo)
+
+            if is_maximizing:
+                value = max(value, child_value)
+                alpha = max(alpha, value)
+            else:
+                value = min(value, child_value)
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+        return value
+
+    # final result under perfect play, scored like a terminal state
+    def _endgame_score(self, state, margin):
+        own_store = P1_store if self.player_id == P1 else P2_store
+        opp_store = P2_store if self.player_id == P1 else P1_store
+        if state.current_player != self.player_id:
+            margin = -margin
+        final = state.board[own_store] - state.board[opp_store] + margin
+        if final > 0:
+            return WIN_SCORE
+        if final < 0:
+            return -WIN_SCORE
+        return 0
+
+    # depth-1 node: play every child, evaluate the non-terminal ones together,
+    # then take the min/max in move order with the same cutoff as _min_max.
+    # children in the endgame table take its exact result, as in _min_max
+    def _frontier(self, state, alpha, beta):
+        killers, history = self._ordering_tables(state, 1)
+        legal_moves = order_moves(state, actions(state), killers, history)
+        self.nodes_explored += len(legal_moves)
+        values = [None] * len(legal_moves)
+        boards = []
+        board_slots = []
+
+        for k, action in enumerate(legal_moves):
+            undo = make_move(state, action)
+            if terminal_test(state):
+                values[k] = utility(state, self.player_id) * WIN_SCORE
+            else:
+                margin = self.endgame.probe(state) if self.endgame is not None else None
+                if margin is not None:
+                    values[k] = self._endgame_score(state, margin)
+                else:
+                    boards.append(state.board[:])
+                    board_slots.append(k)
+            unmake_move(state, undo)
+
+        # every child is a leaf, as it would be at depth 0 in _min_max
+        self.leaves += len(legal_moves)
+        if boards:
+            self.eval_calls += len(boards)
+            scores = self.batch_eval_fn(boards, self.player_id).tolist()
+            for k, score_value in zip(board_slots, scores):
+                values[k] = score_value
+
+        if player(state) == self.player_id:
+            value = -math.inf
+            for child_value in values:
+                value = max(value, child_value)
+                if value >= beta:
                     break
-            return value
\ No newline at end of file
+        else:
+            value = math.inf
+            for child_value in values:
+                value = min(value, child_value)
+                if value <= alpha:
+                    break
+        return value
+
+
+# one player per configuration in each worker process, so its transposition
+# table stays warm across root moves and across choose_action calls
+_worker_players = {}
+# the owning player's cancel event, set by _stop_workers
+_worker_cancel = None
+
+
+def _init_worker(cancel):
+    global _worker_cancel
+    _worker_cancel = cancel
+
+
+# runs in a worker process: value of one root move searched with window (alpha, inf).
+# returns (value, nodes, quiescence nodes), value is None if the time budget ran
+# out or the search was cancelled
+def _search_subtree(config, board, current_player, action, depth, alpha, time_left):
+    key = tuple(sorted(config.items()))
+    searcher = _worker_players.get(key)
+    if searcher is None:
+        searcher = AlphaBetaPlayer(**config)
+        _worker_players[key] = searcher
+    searcher.nodes_explored = 0
+    searcher.quiescence_nodes = 0
+    if searcher.tt is not None:
+        searcher.tt.new_search()
+    searcher._age_ordering()
+    searcher._root_depth = depth
+
+    state = GameState(board, current_player)
+    make_move(state, action)
+    if time_left is not None:
+        searcher._deadline = time.perf_counter() + time_left
+    searcher._stop_event = _worker_cancel
+    try:
+        value = searcher._min_max(state, depth - 1, alpha, math.inf)
+    except SearchTimeout:
+        value = None
+    finally:
+        searcher._deadline = None
+        searcher._stop_event = None
+        if searcher.cache is not None:
+            searcher.cache.flush()
+    return value, searcher.nodes_explored, searcher.quiescence_nodes
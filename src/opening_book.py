@@ -0,0 +1,127 @@
+# opening book: best moves for every position reachable in the first few plies,
+# found offline with a deep search.
+#
+# file layout: 8 byte header (magic, entry count) followed by fixed size records
+# (zobrist key, move) sorted by key. lookups binary search the memory-mapped
+# file, so nothing is read until the first probe and the book is never
+# deserialized as a whole.
+#
+# build from the src directory with:  python opening_book.py --plies 4 --depth 10
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+from game_engine import initial_state, actions, result, terminal_test
+from minmax_pruning import AlphaBetaPlayer
+
+MAGIC = b"KOB1"
+HEADER = struct.Struct("<4sI")
+RECORD = struct.Struct("<QB")
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+
+
+# every non-terminal position within `plies` moves of the start, keyed by zobrist
+def reachable_positions(plies):
+    positions = {}
+    frontier = [initial_state()]
+    for _ in range(plies + 1):
+        next_frontier = []
+        for state in frontier:
+            if state.zobrist in positions or terminal_test(state):
+                continue
+            positions[state.zobrist] = state
+            next_frontier.extend(result(state, a) for a in actions(state))
+        frontier = next_frontier
+    return positions
+
+
+def build_book(plies, depth, eval_func="weighted", workers=1):
+    positions = reachable_positions(plies)
+    searchers = [AlphaBetaPlayer(pid, max_depth=depth, eval_func=eval_func, workers=workers)
+                 for pid in (0, 1)]
+    entries = []
+    start = time.time()
+    for i, (key, state) in enumerate(positions.items(), 1):
+        move = searchers[state.current_player].choose_action(state)
+        entries.append((key, move))
+        sys.stdout.write(f"\r  {i}/{len(positions)} positions ({time.time() - start:.0f}s)")
+        sys.stdout.flush()
+    print()
+    for searcher in searchers:
+        searcher.close()
+    entries.sort()
+    return entries
+
+
+def write_book(path, entries):
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(entries)))
+        for key, move in entries:
+            f.write(RECORD.pack(key, move))
+
+
+class OpeningBook:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.size = 0
+        self._mm = None
+        self._loaded = False
+        self.hits = 0
+
+    def _load(self):
+        self._loaded = True
+        try:
+            with open(self.path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # missing or empty file: an empty book
+            return
+        magic, self.size = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not an opening book")
+
+    # book move for the state, or None
+    def lookup(self, state):
+        if not self._loaded:
+            self._load()
+        key = state.zobrist
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key, move = RECORD.unpack_from(self._mm, HEADER.size + mid * RECORD.size)
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key > key:
+                hi = mid
+            else:
+                self.hits += 1
+                return move
+        return None
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Kalaha opening book")
+    parser.add_argument("--plies", type=int, default=4,
+                        help="book covers every position this many moves from the start")
+    parser.add_argument("--depth", type=int, default=10, help="search depth per position")
+    parser.add_argument("--eval", default="weighted")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--out", default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    start = time.time()
+    entries = build_book(args.plies, args.depth, args.eval, args.workers)
+    write_book(args.out, entries)
+    print(f"  wrote {len(entries)} positions to {args.out} in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
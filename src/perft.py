@@ -0,0 +1,290 @@
+# perft: counts the positions reachable in exactly `depth` moves, to check move
+# generation and to time it. a finished game counts as one leaf wherever it ends.
+# one move is one ply, an extra turn is a ply of the same player.
+#
+# the engines all count the same tree:
+#   reference   - plain sowing loop written straight from the rules, no tables
+#   result      - game_engine.result on a GameState
+#   packed      - game_engine.result on a PackedState
+#   make_unmake - game_engine.make_move/unmake_move on one GameState
+#
+# bulk counting takes the number of moves at depth 1 instead of playing them.
+# the cache stores the count of every (position, depth) subtree searched, as many
+# move orders lead to the same position. --diff walks the reference and another
+# engine in lockstep, comparing the moves and every field of every position, and
+# stops at the first mismatch with the moves that lead to it.
+#
+# run from the src directory with:  python perft.py --depth 9 --engine make_unmake --bulk
+import argparse
+import sys
+import time
+
+from game_engine import (
+    GameState, initial_state, actions, result, make_move, unmake_move, terminal_test,
+    zobrist_hash, nonempty_mask, P1, P1_pits, P2_pits, P1_store, P2_store, Board_size,
+    Total_stones
+)
+
+
+# reference rules on (board, player): the moves, and the position after a move
+def reference_actions(board, current_player):
+    pits = P1_pits if current_player == P1 else P2_pits
+    return [i for i in pits if board[i] > 0]
+
+
+def reference_terminal(board):
+    return all(board[i] == 0 for i in P1_pits) or all(board[i] == 0 for i in P2_pits)
+
+
+def reference_result(board, current_player, action):
+    board = board[:]
+    own_store = P1_store if current_player == P1 else P2_store
+    opponent_store = P2_store if current_player == P1 else P1_store
+    own_pits = P1_pits if current_player == P1 else P2_pits
+
+    stones = board[action]
+    board[action] = 0
+    index = action
+    while stones > 0:
+        index = (index + 1) % Board_size
+        if index == opponent_store:
+            continue
+        board[index] += 1
+        stones -= 1
+
+    extra_turn = index == own_store
+    if index in own_pits and board[index] == 1 and board[12 - index] > 0:
+        board[own_store] += board[12 - index] + 1
+        board[index] = 0
+        board[12 - index] = 0
+
+    if reference_terminal(board):
+        for i in P1_pits:
+            board[P1_store] += board[i]
+            board[i] = 0
+        for i in P2_pits:
+            board[P2_store] += board[i]
+            board[i] = 0
+    elif not extra_turn:
+        current_player = 1 - current_player
+    return board, current_player
+
+
+def perft_reference(board, current_player, depth, bulk=False, cache=None):
+    if depth == 0 or reference_terminal(board):
+        return 1
+    moves = reference_actions(board, current_player)
+    if bulk and depth == 1:
+        return len(moves)
+    if cache is not None:
+        key = (bytes(board), current_player, depth)
+        if key in cache:
+            return cache[key]
+    nodes = 0
+    for a in moves:
+        child, next_player = reference_result(board, current_player, a)
+        nodes += perft_reference(child, next_player, depth - 1, bulk, cache)
+    if cache is not None:
+        cache[key] = nodes
+    return nodes
+
+
+# for GameState and PackedState alike. the cache is keyed by zobrist hash
+def perft_result(state, depth, bulk=False, cache=None):
+    if depth == 0 or terminal_test(state):
+        return 1
+    moves = actions(state)
+    if bulk and depth == 1:
+        return len(moves)
+    if cache is not None:
+        key = (state.zobrist, depth)
+        if key in cache:
+            return cache[key]
+    nodes = 0
+    for a in moves:
+        nodes += perft_result(result(state, a), depth - 1, bulk, cache)
+    if cache is not None:
+        cache[key] = nodes
+    return nodes
+
+
+def perft_make_unmake(state, depth, bulk=False, cache=None):
+    if depth == 0 or terminal_test(state):
+        return 1
+    moves = actions(state)
+    if bulk and depth == 1:
+        return len(moves)
+    if cache is not None:
+        key = (state.zobrist, depth)
+        if key in cache:
+            return cache[key]
+    nodes = 0
+    for a in moves:
+        undo = make_move(state, a)
+        nodes += perft_make_unmake(state, depth - 1, bulk, cache)
+        unmake_move(state, undo)
+    if cache is not None:
+        cache[key] = nodes
+    return nodes
+
+
+ENGINES = ("reference", "result", "packed", "make_unmake")
+
+
+def perft(engine, board, current_player, depth, bulk=False, cache=None):
+    if engine == "reference":
+        return perft_reference(list(board), current_player, depth, bulk, cache)
+    state = GameState(list(board), current_player)
+    if engine == "result":
+        return perft_result(state, depth, bulk, cache)
+    if engine == "packed":
+        return perft_result(state.pack(), depth, bulk, cache)
+    if engine == "make_unmake":
+        return perft_make_unmake(state, depth, bulk, cache)
+    raise ValueError(f"unknown engine {engine!r}, expected one of {', '.join(ENGINES)}")
+
+
+# every field the engine keeps, and what the reference position says it should be
+def _fields(state):
+    return {
+        "board": tuple(state.board),
+        "current_player": state.current_player,
+        "zobrist": state.zobrist,
+        "p1_side": state.p1_side,
+        "p2_side": state.p2_side,
+        "nonempty": state.nonempty,
+        "terminal": terminal_test(state),
+    }
+
+
+def _expected(board, current_player):
+    return {
+        "board": tuple(board),
+        "current_player": current_player,
+        "zobrist": zobrist_hash(board, current_player),
+        "p1_side": sum(board[i] for i in P1_pits),
+        "p2_side": sum(board[i] for i in P2_pits),
+        "nonempty": nonempty_mask(board),
+        "terminal": reference_terminal(board),
+    }
+
+
+# walks the reference and `engine` down to `depth` in lockstep. returns
+# (positions compared, None) or (positions compared, mismatch), where the
+# mismatch is {"moves", "field", "reference", "engine"} for the first difference
+def differential(engine, board, current_player, depth):
+    if engine not in ENGINES or engine == "reference":
+        raise ValueError(f"engine to compare must be one of {', '.join(ENGINES[1:])}")
+    state = GameState(list(board), current_player)
+    if engine == "packed":
+        state = state.pack()
+    checked = [0]
+
+    def compare(ref_board, ref_player, state, path):
+        checked[0] += 1
+        expected = _expected(ref_board, ref_player)
+        got = _fields(state)
+        for name, value in expected.items():
+            if got[name] != value:
+                return {"moves": path, "field": name, "reference": value, "engine": got[name]}
+        return None
+
+    def walk(ref_board, ref_player, state, depth, path):
+        mismatch = compare(ref_board, ref_player, state, path)
+        if mismatch is not None or depth == 0 or reference_terminal(ref_board):
+            return mismatch
+        ref_moves = reference_actions(ref_board, ref_player)
+        moves = actions(state)
+        if moves != ref_moves:
+            return {"moves": path, "field": "actions", "reference": ref_moves, "engine": moves}
+        for a in moves:
+            child_board, child_player = reference_result(ref_board, ref_player, a)
+            if engine == "make_unmake":
+                before = _fields(state)
+                undo = make_move(state, a)
+                mismatch = walk(child_board, child_player, state, depth - 1, path + [a])
+                unmake_move(state, undo)
+                if mismatch is None and _fields(state) != before:
+                    after = _fields(state)
+                    field = next(k for k in before if before[k] != after[k])
+                    mismatch = {"moves": path + [a], "field": f"{field} after unmake",
+                                "reference": before[field], "engine": after[field]}
+            else:
+                mismatch = walk(child_board, child_player, result(state, a), depth - 1, path + [a])
+            if mismatch is not None:
+                return mismatch
+        return None
+
+    mismatch = walk(list(board), current_player, state, depth, [])
+    return checked[0], mismatch
+
+
+def _parse_board(text):
+    board = [int(v) for v in text.split(",")]
+    if len(board) != Board_size or min(board) < 0:
+        raise ValueError(f"a board is {Board_size} comma separated stone counts")
+    # the zobrist keys only cover boards with at most Total_stones stones
+    if max(board) > Total_stones or sum(board) > Total_stones:
+        raise ValueError(f"a board holds at most {Total_stones} stones")
+    return board
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kalaha perft: move generation counts and checks")
+    parser.add_argument("--depth", type=int, default=8)
+    parser.add_argument("--engine", default="make_unmake", choices=ENGINES)
+    parser.add_argument("--bulk", action="store_true", help="count the last ply without playing it")
+    parser.add_argument("--cache", action="store_true", help="reuse the counts of repeated subtrees")
+    parser.add_argument("--divide", action="store_true", help="print the count below every root move")
+    parser.add_argument("--diff", action="store_true",
+                        help="compare --engine against the reference engine position by position")
+    parser.add_argument("--board", default=None,
+                        help="start position as 14 comma separated counts (default: initial)")
+    parser.add_argument("--player", type=int, default=P1, choices=(0, 1))
+    args = parser.parse_args()
+
+    if args.board is not None:
+        try:
+            board = _parse_board(args.board)
+        except ValueError as e:
+            parser.error(str(e))
+        current_player = args.player
+    else:
+        start = initial_state()
+        board, current_player = start.board, start.current_player
+
+    if args.diff:
+        if args.engine == "reference":
+            parser.error("--diff needs an --engine other than reference")
+        start = time.perf_counter()
+        checked, mismatch = differential(args.engine, board, current_player, args.depth)
+        elapsed = time.perf_counter() - start
+        print(f"  compared {checked} positions to depth {args.depth} in {elapsed:.2f}s")
+        if mismatch is None:
+            print(f"  {args.engine} matches the reference")
+            return
+        print(f"  MISMATCH in {mismatch['field']} after moves {mismatch['moves']}")
+        print(f"    reference: {mismatch['reference']}")
+        print(f"    {args.engine}: {mismatch['engine']}")
+        sys.exit(1)
+
+    print(f"  {'depth':>5} {'nodes':>14} {'time':>9} {'nodes/s':>14}")
+    for depth in range(1, args.depth + 1):
+        cache = {} if args.cache else None
+        start = time.perf_counter()
+        nodes = perft(args.engine, board, current_player, depth, args.bulk, cache)
+        elapsed = time.perf_counter() - start
+        rate = nodes / elapsed if elapsed > 0 else 0.0
+        print(f"  {depth:>5} {nodes:>14,} {elapsed:>8.3f}s {rate:>14,.0f}")
+
+    if args.divide:
+        print()
+        for a in reference_actions(board, current_player):
+            child, next_player = reference_result(board, current_player, a)
+            cache = {} if args.cache else None
+            nodes = perft(args.engine, child, next_player, args.depth - 1, args.bulk, cache)
+            print(f"  {a:>5} {nodes:>14,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# persistent search cache: search results that outlive the player, the game and
+# the process. AlphaBetaPlayer consults it when its transposition table has
+# nothing deep enough for a node, so a restarted session or another benchmark
+# worker starts from everything searched before.
+#
+# the cache is one SQLite database in WAL mode: any number of processes read
+# it at the same time while one of them writes. an entry is keyed by
+# (zobrist key, player, context), where the player is the side the values are
+# scored for and the context names everything else the value depends on (eval
+# function and weights, quiescence depth, endgame table). writes are buffered and committed
+# in one transaction per flush, keeping the deeper of two results for the same
+# position. above max_entries the least recently used entries are dropped
+# (checked every TRIM_INTERVAL flushes, counting the rows is a full scan).
+import json
+import os
+import sqlite3
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_cache (
+    key INTEGER NOT NULL,
+    player INTEGER NOT NULL,
+    context TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    value REAL NOT NULL,
+    flag INTEGER NOT NULL,
+    move INTEGER,
+    used REAL NOT NULL,
+    PRIMARY KEY (key, player, context)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS search_cache_used ON search_cache (used);
+"""
+
+_UPSERT = """
+INSERT INTO search_cache (key, player, context, depth, value, flag, move, used)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (key, player, context) DO UPDATE SET
+    depth = excluded.depth, value = excluded.value, flag = excluded.flag,
+    move = excluded.move, used = excluded.used
+WHERE excluded.depth >= search_cache.depth
+"""
+
+
+TRIM_INTERVAL = 64
+
+
+# zobrist keys are unsigned 64 bit, SQLite integers are signed
+def _signed(key):
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+# the part of a player's configuration that changes search values. eval_fn is
+# the unwrapped evaluation function, its weights are part of the context
+def search_context(eval_func, eval_fn, quiescence_depth, endgame_path=None):
+    weights = getattr(eval_fn, "weights", None)
+    if endgame_path is not None:
+        endgame_path = os.path.abspath(endgame_path)
+    return json.dumps([eval_func, weights, quiescence_depth, endgame_path], sort_keys=True)
+
+
+class SearchCache:
+    def __init__(self, path, context, max_entries=1_000_000):
+        self.path = path
+        self.context = context
+        self.max_entries = max_entries
+        self._db = None
+        self._pending = {}
+        self._touched = set()
+        self._flushes = 0
+        self.hits = 0
+        self.probes = 0
+
+    def _connect(self):
+        # timeout: how long a writer waits for another process's transaction
+        self._db = sqlite3.connect(self.path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    # (key, depth, value, flag, best_move, age) like a transposition table entry,
+    # or None. results put since the last flush are seen too
+    def probe(self, key, player):
+        if self._db is None:
+            self._connect()
+        self.probes += 1
+        pending = self._pending.get((key, player))
+        if pending is not None:
+            self.hits += 1
+            depth, value, flag, move = pending
+            return (key, depth, value, flag, move, 0)
+        row = self._db.execute(
+            "SELECT depth, value, flag, move FROM search_cache "
+            "WHERE key = ? AND player = ? AND context = ?",
+            (_signed(key), player, self.context)).fetchone()
+        if row is None:
+            return None
+        self.hits += 1
+        self._touched.add((key, player))
+        depth, value, flag, move = row
+        return (key, depth, value, flag, move, 0)
+
+    def put(self, key, player, depth, value, flag, move):
+        old = self._pending.get((key, player))
+        if old is None or depth >= old[0]:
+            self._pending[(key, player)] = (depth, value, flag, move)
+
+    # writes the buffered results and the recently used marks in one transaction
+    def flush(self):
+        if not self._pending and not self._touched:
+            return
+        if self._db is None:
+            self._connect()
+        now = time.time()
+        with self._db:
+            self._db.executemany(_UPSERT, [
+                (_signed(key), player, self.context, depth, value, flag, move, now)
+                for (key, player), (depth, value, flag, move) in self._pending.items()
+            ])
+            self._db.executemany(
+                "UPDATE search_cache SET used = ? WHERE key = ? AND player = ? AND context = ?",
+                [(now, _signed(key), player, self.context) for key, player in self._touched])
+            if self._flushes % TRIM_INTERVAL == 0:
+                self._trim()
+        self._flushes += 1
+        self._pending.clear()
+        self._touched.clear()
+
+    def _trim(self):
+        count = self._db.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        if count > self.max_entries:
+            self._db.execute(
+                "DELETE FROM search_cache WHERE used <= "
+                "(SELECT used FROM search_cache ORDER BY used LIMIT 1 OFFSET ?)",
+                (count - self.max_entries - 1,))
+
+    def close(self):
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
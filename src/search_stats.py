@@ -0,0 +1,78 @@
+# per-move search statistics. AlphaBetaPlayer fills in one SearchStats per
+# choose_action call when it is given an on_stats callback, and passes it to the
+# callback. JsonLinesSink is such a callback that appends one JSON object per move.
+import json
+from dataclasses import dataclass, field, asdict
+
+
+@dataclass
+class SearchStats:
+    player_id: int
+    move: int = None
+    # deepest finished iteration, 0 for a book move or a stopped search
+    depth_reached: int = 0
+    wall_time: float = 0.0
+    # nodes of the whole search, worker processes included
+    nodes: int = 0
+    # nodes of each finished iterative deepening iteration, by depth
+    nodes_by_depth: dict = field(default_factory=dict)
+    quiescence_nodes: int = 0
+    # eval_fn calls plus boards scored by the batched frontier
+    eval_calls: int = 0
+    # nodes scored without searching further: terminal, endgame table, static
+    # eval and quiescence stand-pat
+    leaves: int = 0
+    # beta cutoffs, and how many of them came from the first move tried
+    cutoffs: int = 0
+    first_move_cutoffs: int = 0
+    first_move_cutoff_rate: float = 0.0
+    # nodes of the last iteration over the one before, or nodes^(1/depth) with one
+    effective_branching_factor: float = 0.0
+    nodes_per_second: float = 0.0
+    tt_probes: int = 0
+    tt_hits: int = 0
+    tt_hit_rate: float = 0.0
+    cache_probes: int = 0
+    cache_hits: int = 0
+    cache_hit_rate: float = 0.0
+    endgame_hits: int = 0
+    book_hit: bool = False
+
+    # fills in the fields derived from the counters
+    def finish(self):
+        if self.cutoffs:
+            self.first_move_cutoff_rate = self.first_move_cutoffs / self.cutoffs
+        if self.wall_time > 0:
+            self.nodes_per_second = self.nodes / self.wall_time
+        if self.tt_probes:
+            self.tt_hit_rate = self.tt_hits / self.tt_probes
+        if self.cache_probes:
+            self.cache_hit_rate = self.cache_hits / self.cache_probes
+        depths = sorted(self.nodes_by_depth)
+        if len(depths) >= 2 and self.nodes_by_depth[depths[-2]]:
+            self.effective_branching_factor = (self.nodes_by_depth[depths[-1]]
+                                               / self.nodes_by_depth[depths[-2]])
+        elif self.depth_reached and self.nodes:
+            self.effective_branching_factor = self.nodes ** (1 / self.depth_reached)
+        return self
+
+    def to_dict(self):
+        return asdict(self)
+
+
+# appends each SearchStats as one line of JSON, together with the fixed `context`
+# fields (e.g. game number, player settings). the file is opened per line, so the
+# sink can be pickled into benchmark worker processes that append to the same file
+class JsonLinesSink:
+    def __init__(self, path, **context):
+        self.path = path
+        self.context = context
+
+    # the same file with more context fields
+    def with_context(self, **context):
+        return JsonLinesSink(self.path, **{**self.context, **context})
+
+    def __call__(self, stats):
+        record = {**self.context, **stats.to_dict()}
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
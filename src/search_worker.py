@@ -0,0 +1,94 @@
+# one persistent background thread for the GUI's AI searches, instead of a new
+# thread per move. jobs run one at a time, and every job belongs to the
+# generation that was current when it was submitted; new_generation() starts a
+# new one (a new game) and cancels everything older.
+#
+# a job is fn(stop_event, *args). submitting a job or cancel() sets the stop
+# event of the running job, which AlphaBetaPlayer checks inside the search every
+# TIME_CHECK_INTERVAL nodes, so the thread is free again within milliseconds.
+# results of cancelled jobs and of older generations are dropped, poll() only
+# returns the current generation's. on_result, if given, is called from the
+# worker thread whenever a result is ready, e.g. to wake up a waiting event loop.
+import queue
+import threading
+import traceback
+
+
+class SearchWorker:
+    def __init__(self, on_result=None):
+        self.generation = 0
+        self.on_result = on_result
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+        self._stop = None
+        self._running = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # cancels every job and returns the new generation id
+    def new_generation(self):
+        with self._lock:
+            self.generation += 1
+            self._cancel()
+            return self.generation
+
+    # runs fn(stop_event, *args) after the running job is cancelled
+    def submit(self, fn, *args):
+        stop = threading.Event()
+        with self._lock:
+            self._cancel()
+            self._stop = stop
+            self._jobs.put((self.generation, stop, fn, args))
+
+    def cancel(self):
+        with self._lock:
+            self._cancel()
+
+    def _cancel(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+
+    # a job is queued or running
+    @property
+    def busy(self):
+        return self._running or not self._jobs.empty()
+
+    # results of the finished jobs of the current generation, oldest first
+    def poll(self):
+        found = []
+        while True:
+            try:
+                generation, value = self._results.get_nowait()
+            except queue.Empty:
+                return found
+            if generation == self.generation:
+                found.append(value)
+
+    def close(self):
+        self.cancel()
+        self._jobs.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            generation, stop, fn, args = job
+            if stop.is_set():
+                continue
+            self._running = True
+            try:
+                value = fn(stop, *args)
+            except Exception:
+                # keep the thread alive for the next job
+                traceback.print_exc()
+                continue
+            finally:
+                self._running = False
+            if not stop.is_set() and generation == self.generation:
+                self._results.put((generation, value))
+                if self.on_result is not None:
+                    self.on_result()
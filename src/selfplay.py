@@ -0,0 +1,178 @@
+# self-play data: AlphaBetaPlayer plays itself from random openings and every
+# searched position is written out with its search score and the game's result.
+#
+# output is a directory of chunk files, chunk k holding games k*G .. k*G+G-1.
+# a chunk's games depend only on the settings and k, so chunks are played in any
+# order by any number of worker processes. each chunk is written to a .part file
+# as its games finish and renamed when complete, so an interrupted run resumes
+# by playing the chunks that have no final file yet.
+#
+# chunk layout: 12 byte header (magic, games, positions) followed by fixed size
+# records (board, side to move, ply, move, score, result):
+#   board  - the 14 pits and stores, one byte each
+#   score  - root value of the search, from the side to move (NaN for book moves)
+#   result - final store difference, from the side to move
+#
+# run from the src directory with:  python selfplay.py --games 1000 --jobs 4
+import argparse
+import json
+import math
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from game_engine import P1, P2
+from benchmark import play_game
+from minmax_pruning import AlphaBetaPlayer
+
+MAGIC = b"KSP1"
+HEADER = struct.Struct("<4sII")
+RECORD = struct.Struct("<14sBBBfb")
+SETTINGS_FILE = "settings.json"
+
+
+def chunk_path(out_dir, chunk):
+    return os.path.join(out_dir, f"chunk_{chunk:06d}.bin")
+
+
+# plays the games of one chunk and writes them. returns (chunk, positions)
+def play_chunk(out_dir, chunk, settings):
+    games = settings["chunk_games"]
+    players = (
+        AlphaBetaPlayer(P1, max_depth=settings["depth"], eval_func=settings["eval"]),
+        AlphaBetaPlayer(P2, max_depth=settings["depth"], eval_func=settings["eval"]),
+    )
+    path = chunk_path(out_dir, chunk)
+    part = path + ".part"
+    positions = 0
+
+    with open(part, "wb") as f:
+        f.write(HEADER.pack(MAGIC, 0, 0))
+        for g in range(chunk * games, (chunk + 1) * games):
+            # only this game's positions are held, until its result is known
+            moves = []
+            played = [0]
+
+            def on_move(state, action, mover):
+                if mover is not None:
+                    score = mover.last_value if mover.last_value is not None else math.nan
+                    moves.append((bytes(state.board), state.current_player, played[0],
+                                  action, score))
+                played[0] += 1
+
+            random.seed(f"{settings['seed']}-{g}")
+            s1, s2, _ = play_game(*players, opening_plies=settings["opening_plies"],
+                                  on_move=on_move)
+            for board, side, ply, action, score in moves:
+                margin = s1 - s2 if side == P1 else s2 - s1
+                f.write(RECORD.pack(board, side, ply, action, score, margin))
+            positions += len(moves)
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, games, positions))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(part, path)
+    return chunk, positions
+
+
+# yields (board, side to move, ply, move, score, result) for every record of a chunk
+def read_chunk(path):
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with mm:
+        magic, _, positions = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a self-play chunk")
+        for i in range(positions):
+            board, side, ply, move, score, margin = RECORD.unpack_from(
+                mm, HEADER.size + i * RECORD.size)
+            yield tuple(board), side, ply, move, score, margin
+
+
+# every record of every finished chunk in the directory, in chunk order
+def iter_positions(out_dir):
+    for name in sorted(os.listdir(out_dir)):
+        if name.startswith("chunk_") and name.endswith(".bin"):
+            yield from read_chunk(os.path.join(out_dir, name))
+
+
+# plays every chunk of the run that is not on disk yet
+def generate(out_dir, settings, total_games, jobs=1):
+    os.makedirs(out_dir, exist_ok=True)
+    settings_path = os.path.join(out_dir, SETTINGS_FILE)
+    if os.path.exists(settings_path):
+        with open(settings_path) as f:
+            existing = json.load(f)
+        if existing != settings:
+            raise ValueError(f"{out_dir} was generated with different settings: {existing}")
+    else:
+        with open(settings_path, "w") as f:
+            json.dump(settings, f, indent=2)
+
+    # leftovers of an interrupted run, those chunks are played again
+    for name in os.listdir(out_dir):
+        if name.endswith(".part"):
+            os.remove(os.path.join(out_dir, name))
+
+    chunks = math.ceil(total_games / settings["chunk_games"])
+    todo = [c for c in range(chunks) if not os.path.exists(chunk_path(out_dir, c))]
+    print(f"  {chunks - len(todo)}/{chunks} chunks already done")
+
+    start = time.time()
+    positions = 0
+    if jobs <= 1:
+        results = (play_chunk(out_dir, c, settings) for c in todo)
+        for done, (_, n) in enumerate(results, 1):
+            positions += n
+            _progress(done, len(todo), positions, start)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(play_chunk, out_dir, c, settings) for c in todo]
+            for done, future in enumerate(as_completed(futures), 1):
+                positions += future.result()[1]
+                _progress(done, len(todo), positions, start)
+    print()
+    return positions
+
+
+def _progress(done, total, positions, start):
+    sys.stdout.write(f"\r  chunks: {done}/{total}  positions: {positions}"
+                     f"  ({time.time() - start:.0f}s)")
+    sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate Kalaha self-play positions")
+    parser.add_argument("--games", type=int, default=1000,
+                        help="total games, rounded up to whole chunks")
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--eval", default="weighted")
+    parser.add_argument("--opening-plies", type=int, default=4,
+                        help="random moves at the start of every game")
+    parser.add_argument("--chunk-games", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--out", default="selfplay")
+    args = parser.parse_args()
+
+    settings = {
+        "depth": args.depth,
+        "eval": args.eval,
+        "opening_plies": args.opening_plies,
+        "chunk_games": args.chunk_games,
+        "seed": args.seed,
+    }
+    try:
+        positions = generate(args.out, settings, args.games, args.jobs)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"  wrote {positions} positions to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+# round-robin tournament with Elo estimates and SPRT early stopping.
+#
+# every pairing plays game pairs: the same random opening twice with the sides
+# swapped, like run_matchup. after each pair a sequential probability ratio test
+# decides between "the first player is `margin` Elo stronger" (H1) and "it is
+# `margin` Elo weaker" (H0), and the pairing stops as soon as either is accepted
+# with error rates alpha and beta, or after max_pairs pairs. the test is the
+# normal approximation of the generalized SPRT on the pair scores (0, 1/4, 1/2,
+# 3/4, 1), which keeps the two games of a pair, correlated through their
+# opening, together.
+#
+# results are applied in pair order whatever process finished them first, so
+# where a pairing stops does not depend on the number of jobs. pairs that finish
+# after their pairing stopped are dropped.
+#
+# Elo ratings are the maximum likelihood fit of the logistic model over all
+# games, with one virtual draw per pairing so a player that never scores still
+# gets a finite rating. the intervals are 95% from the inverse fisher
+# information, the ratings are centred on a mean of 0.
+#
+# run from the src directory with:  python benchmark.py --tournament [--players ...]
+import math
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from functools import partial
+
+import numpy as np
+
+from evaluation import EVAL_FUNCTIONS
+from minmax_pruning import AlphaBetaPlayer, ALGORITHMS, ORDERINGS
+
+PAIR_SCORES = (0.0, 0.25, 0.5, 0.75, 1.0)
+# pseudo-count per pair score, keeps the variance above 0 when every pair ends the same
+PAIR_PRIOR = 1e-3
+# pairs played before the test is first applied
+MIN_PAIRS = 4
+Z95 = 1.96
+
+DEFAULT_ENTRANTS = ["random", "greedy", "ab:depth=2", "ab:depth=4", "ab:depth=6",
+                    "ab:depth=6,eval=positional"]
+
+# short names of the AlphaBetaPlayer options in an entrant spec
+_OPTION_NAMES = {
+    "depth": "max_depth",
+    "eval": "eval_func",
+    "time": "time_limit",
+    "quiescence": "quiescence_depth",
+}
+
+
+def _flag(text):
+    if text.lower() in ("1", "true", "yes"):
+        return True
+    if text.lower() in ("0", "false", "no"):
+        return False
+    raise ValueError(text)
+
+
+# the AlphaBetaPlayer keywords an entrant may set, with the type of their value
+_OPTION_TYPES = {
+    "max_depth": int,
+    "eval_func": str,
+    "tt_size_log2": int,
+    "time_limit": float,
+    "batch_leaves": _flag,
+    "workers": int,
+    "endgame_path": str,
+    "book_path": str,
+    "ordering": str,
+    "algorithm": str,
+    "quiescence_depth": int,
+    "cache_path": str,
+    "cache_min_depth": int,
+    "cache_max_entries": int,
+}
+# and the allowed values of some
+_OPTION_CHOICES = {
+    "eval_func": EVAL_FUNCTIONS,
+    "algorithm": ALGORITHMS,
+    "ordering": ORDERINGS,
+}
+
+
+def _option_value(text):
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def _spec_options(spec, options, convert=_option_value):
+    parsed = {}
+    for option in filter(None, options.split(",")):
+        name, sep, value = option.partition("=")
+        if not sep:
+            raise ValueError(f"bad option {option!r} in {spec!r}, expected name=value")
+        parsed[name] = convert(value)
+    return parsed
+
+
+# a player factory from a spec: "random", "greedy", "ab[:option=value,...]" or
+# "engine[:option=value,...]", e.g. "ab:depth=6,eval=positional,algorithm=pvs".
+# search_options go to every AlphaBetaPlayer, the spec's own options win.
+# "engine" plays through the engine protocol (see engine_player.EnginePlayer),
+# its options are engine options and time is the time per move. engine holds
+# the EnginePlayer arguments shared by all of them (command or address)
+def parse_entrant(spec, search_options=None, engine=None):
+    from benchmark import RandomPlayer, GreedyPlayer
+
+    kind, _, options = spec.partition(":")
+    if kind == "random" and not options:
+        return RandomPlayer
+    if kind == "greedy" and not options:
+        return GreedyPlayer
+    if kind == "engine":
+        from engine_player import EnginePlayer
+
+        kwargs = _spec_options(spec, options)
+        if "time" in kwargs:
+            kwargs["movetime"] = kwargs.pop("time")
+        return partial(EnginePlayer, **(engine or {}), **kwargs)
+    if kind != "ab":
+        raise ValueError(f"unknown player spec {spec!r}")
+    kwargs = dict(search_options or {})
+    for name, text in _spec_options(spec, options, str).items():
+        keyword = _OPTION_NAMES.get(name, name)
+        # checked here, not when the first game builds the player in a worker
+        if keyword not in _OPTION_TYPES:
+            raise ValueError(f"unknown option {name!r} in {spec!r}")
+        kind = _OPTION_TYPES[keyword]
+        try:
+            value = kind(text)
+        except ValueError:
+            raise ValueError(f"{name} in {spec!r} must be {kind.__name__.lstrip('_')}, got {text!r}") from None
+        choices = _OPTION_CHOICES.get(keyword)
+        if choices is not None and value not in choices:
+            raise ValueError(f"{name} in {spec!r} must be one of {', '.join(choices)}")
+        kwargs[keyword] = value
+    return partial(AlphaBetaPlayer, **kwargs)
+
+
+def elo_to_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def score_to_elo(s):
+    s = min(max(s, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / s - 1)
+
+
+def sprt_bounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+# mean and variance of the pair scores, with PAIR_PRIOR added to every count
+def _pair_moments(counts):
+    total = sum(counts) + PAIR_PRIOR * len(counts)
+    probs = [(c + PAIR_PRIOR) / total for c in counts]
+    mean = sum(p * s for p, s in zip(probs, PAIR_SCORES))
+    var = sum(p * (s - mean) ** 2 for p, s in zip(probs, PAIR_SCORES))
+    return mean, var
+
+
+# log-likelihood ratio of elo1 against elo0 for the pair score counts
+def sprt_llr(counts, elo0, elo1):
+    n = sum(counts)
+    if not n:
+        return 0.0
+    mean, var = _pair_moments(counts)
+    s0, s1 = elo_to_score(elo0), elo_to_score(elo1)
+    return n * (s1 - s0) * (2 * mean - s0 - s1) / (2 * var)
+
+
+class Pairing:
+    def __init__(self, a, b, label):
+        self.a = a
+        self.b = b
+        self.label = label
+        # number of pairs with each of PAIR_SCORES, for player a
+        self.counts = [0] * len(PAIR_SCORES)
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+        self.llr = 0.0
+        # "H1" (a stronger), "H0" (b stronger), "max pairs" or None while running
+        self.decision = None
+        self.submitted = 0
+        self._next = 0
+        self._waiting = {}
+
+    @property
+    def pairs(self):
+        return sum(self.counts)
+
+    # takes the result of pair `index`, ((s1, s2, moves), (s1, s2, moves)) with
+    # a's score first, and applies every pair that is now next in order
+    def record(self, index, games, test):
+        self._waiting[index] = games
+        while self.decision is None and self._next in self._waiting:
+            pair_score = 0.0
+            for s1, s2, _ in self._waiting.pop(self._next):
+                if s1 > s2:
+                    self.wins += 1
+                    pair_score += 0.5
+                elif s1 < s2:
+                    self.losses += 1
+                else:
+                    self.draws += 1
+                    pair_score += 0.25
+            self.counts[PAIR_SCORES.index(pair_score)] += 1
+            self._next += 1
+            self.decision = test(self)
+
+    def elo(self):
+        mean, var = _pair_moments(self.counts)
+        margin = Z95 * math.sqrt(var / max(self.pairs, 1))
+        return (score_to_elo(mean), score_to_elo(mean - margin), score_to_elo(mean + margin))
+
+
+# both games of pair `index`, from the same opening with the sides swapped
+def play_pair(f1, f2, seed, opening_plies):
+    from benchmark import play_matchup_game
+
+    return (play_matchup_game(f1, f2, False, seed, opening_plies),
+            play_matchup_game(f1, f2, True, seed, opening_plies))
+
+
+# maximum likelihood Elo ratings from the pairings' game results, by newton's
+# method. returns (ratings, 95% interval half-widths)
+def fit_ratings(num_players, pairings, iterations=50):
+    c = math.log(10) / 400
+    points = np.zeros((num_players, num_players))
+    games = np.zeros((num_players, num_players))
+    for p in pairings:
+        # the virtual draw
+        score = p.wins + 0.5 * p.draws + 0.5
+        n = p.wins + p.draws + p.losses + 1
+        points[p.a, p.b] += score
+        points[p.b, p.a] += n - score
+        games[p.a, p.b] += n
+        games[p.b, p.a] += n
+
+    ratings = np.zeros(num_players)
+    for _ in range(iterations):
+        expected = 1 / (1 + np.exp(-c * (ratings[:, None] - ratings[None, :])))
+        grad = c * (points - games * expected).sum(axis=1)
+        weights = c * c * games * expected * (1 - expected)
+        information = np.diag(weights.sum(axis=1)) - weights
+        # the ratings are only fixed up to a constant, pinv keeps their mean at 0
+        cov = np.linalg.pinv(information)
+        step = cov @ grad
+        ratings += step
+        if np.abs(step).max() < 1e-6:
+            break
+    ratings -= ratings.mean()
+    return ratings, Z95 * np.sqrt(np.clip(np.diag(cov), 0, None))
+
+
+# entrants: {name: factory}, factories must be picklable when jobs > 1
+def run_tournament(entrants, max_pairs=200, margin=30.0, alpha=0.05, beta=0.05,
+                   jobs=1, seed=0, opening_plies=4):
+    from benchmark import tag_stats
+
+    names = list(entrants)
+    factories = list(entrants.values())
+    pairings = [Pairing(i, j, f"{names[i]} vs {names[j]}")
+                for i in range(len(names)) for j in range(i + 1, len(names))]
+    lower, upper = sprt_bounds(alpha, beta)
+
+    def test(p):
+        p.llr = sprt_llr(p.counts, -margin, margin)
+        if p.pairs >= MIN_PAIRS:
+            if p.llr >= upper:
+                return "H1"
+            if p.llr <= lower:
+                return "H0"
+        if p.pairs >= max_pairs:
+            return "max pairs"
+        return None
+
+    def task(p):
+        index = p.submitted
+        p.submitted += 1
+        return (tag_stats(factories[p.a], matchup=p.label, ai=1, pair=index),
+                tag_stats(factories[p.b], matchup=p.label, ai=2, pair=index),
+                f"{seed}-{p.label}-{index}", opening_plies)
+
+    start = time.time()
+    if jobs <= 1:
+        for p in pairings:
+            while p.decision is None:
+                index = p.submitted
+                p.record(index, play_pair(*task(p)), test)
+                _progress(pairings, start)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            running = {}
+            while True:
+                # keep every worker busy, spreading the work over the open pairings
+                open_pairings = [p for p in pairings
+                                 if p.decision is None and p.submitted < max_pairs]
+                while len(running) < jobs * 2 and open_pairings:
+                    p = min(open_pairings, key=lambda p: p.submitted - p.pairs)
+                    index = p.submitted
+                    running[pool.submit(play_pair, *task(p))] = (p, index)
+                    if p.submitted >= max_pairs:
+                        open_pairings.remove(p)
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    p, index = running.pop(future)
+                    p.record(index, future.result(), test)
+                for future, (p, _) in list(running.items()):
+                    if p.decision is not None and future.cancel():
+                        del running[future]
+                _progress(pairings, start)
+    print()
+
+    ratings, intervals = fit_ratings(len(names), pairings)
+    print_tournament(names, pairings, ratings, intervals, margin)
+    return {
+        "ratings": {name: (float(r), float(ci)) for name, r, ci in zip(names, ratings, intervals)},
+        "pairings": {p.label: {"wins": p.wins, "draws": p.draws, "losses": p.losses,
+                               "llr": p.llr, "decision": p.decision} for p in pairings},
+        "total_time": time.time() - start,
+    }
+
+
+def _progress(pairings, start):
+    games = sum(2 * p.pairs for p in pairings)
+    settled = sum(p.decision is not None for p in pairings)
+    sys.stdout.write(f"\r  Games played: {games}  pairings settled: {settled}/{len(pairings)}"
+                     f"  ({time.time() - start:.0f}s)")
+    sys.stdout.flush()
+
+
+def print_tournament(names, pairings, ratings, intervals, margin):
+    width = max(len(p.label) for p in pairings)
+    print(f"\n  {'pairing':<{width}} {'games':>6} {'W-D-L':>11} {'elo diff':>16} {'LLR':>7}  result")
+    for p in pairings:
+        elo, low, high = p.elo()
+        wdl = f"{p.wins}-{p.draws}-{p.losses}"
+        if p.decision == "H1":
+            outcome = f"first stronger by {margin:g}+"
+        elif p.decision == "H0":
+            outcome = f"second stronger by {margin:g}+"
+        else:
+            outcome = "not settled"
+        diff = f"{elo:+.0f} [{low:+.0f},{high:+.0f}]"
+        print(f"  {p.label:<{width}} {2 * p.pairs:>6} {wdl:>11} {diff:>16} {p.llr:>7.2f}  {outcome}")
+
+    width = max(len(name) for name in names)
+    print(f"\n  {'player':<{width}} {'elo':>6} {'95% ci':>8}")
+    for i in np.argsort(-ratings):
+        print(f"  {names[i]:<{width}} {ratings[i]:>+6.0f} {'±':>3}{intervals[i]:>5.0f}")
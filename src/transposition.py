@@ -0,0 +1,45 @@
+# bounded transposition table for the alpha-beta search, keyed by GameState.zobrist
+
+EXACT = 0
+LOWER = 1  # value is a lower bound (search failed high)
+UPPER = 2  # value is an upper bound (search failed low)
+
+# slot layout: (key, depth, value, flag, best_move, age)
+KEY, DEPTH, VALUE, FLAG, BEST_MOVE, AGE = range(6)
+
+
+class TranspositionTable:
+    def __init__(self, size_log2=20):
+        self.size = 1 << size_log2
+        self.mask = self.size - 1
+        self.table = [None] * self.size
+        self.age = 0
+        self.hits = 0
+        self.probes = 0
+
+    def new_search(self):
+        # entries from older searches are kept but lose replacement priority
+        self.age += 1
+
+    def clear(self):
+        self.table = [None] * self.size
+        self.age = 0
+        self.hits = 0
+        self.probes = 0
+
+    def probe(self, key):
+        self.probes += 1
+        entry = self.table[key & self.mask]
+        if entry is not None and entry[KEY] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, value, flag, best_move):
+        slot = key & self.mask
+        old = self.table[slot]
+        # replace empty slots, stale entries and the same position;
+        # otherwise prefer the deeper search
+        if (old is None or old[AGE] != self.age or old[KEY] == key
+                or depth >= old[DEPTH]):
+            self.table[slot] = (key, depth, value, flag, best_move, self.age)
@@ -0,0 +1,232 @@
+# texel-style tuning of the evaluation weights on self-play positions (needs numpy).
+#
+# both tunable evaluators are linear in their features, so the features of every
+# position are computed once into an (N, k) matrix. a position's label is its
+# game result for the side to move (1 win, 0.5 draw, 0 loss), and the weights w
+# are fitted so that sigmoid(K * X @ w) predicts it, minimizing the logistic loss
+# with newton steps. K is first fitted for the current weights and then kept,
+# so the tuned weights stay on the same scale as the hand-written ones.
+#
+# the loss is convex in w and every step is a few matrix products, so a million
+# positions take seconds. tuned weights are written to a config that
+# evaluation.load_eval_config reads (the default path is loaded on import).
+#
+# run from the src directory with:  python tune_eval.py --data selfplay
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from evaluation import (
+    WEIGHTED_DEFAULTS, POSITIONAL_DEFAULTS, DEFAULT_CONFIG_PATH, BUILTIN_EVAL_FUNCTIONS
+)
+from selfplay import HEADER, MAGIC, SETTINGS_FILE
+
+# the self-play record layout as a numpy dtype, see selfplay.RECORD
+RECORD_DTYPE = np.dtype([("board", "u1", 14), ("side", "u1"), ("ply", "u1"),
+                         ("move", "u1"), ("score", "<f4"), ("result", "i1")])
+_STORE_DISTANCE = np.array([6, 5, 4, 3, 2, 1])
+_PIT_INDEX = np.arange(6)
+
+
+# boards, side to move and labels of every self-play record in the directory
+def load_positions(data_dir, max_positions=None):
+    parts = []
+    total = 0
+    for name in sorted(os.listdir(data_dir)):
+        if not (name.startswith("chunk_") and name.endswith(".bin")):
+            continue
+        path = os.path.join(data_dir, name)
+        with open(path, "rb") as f:
+            magic, _, positions = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a self-play chunk")
+        parts.append(np.fromfile(path, dtype=RECORD_DTYPE, count=positions, offset=HEADER.size))
+        total += positions
+        if max_positions is not None and total >= max_positions:
+            break
+    if not parts:
+        raise ValueError(f"no self-play chunks in {data_dir}")
+    records = np.concatenate(parts)[:max_positions]
+    labels = (np.sign(records["result"]).astype(np.float64) + 1) / 2
+    return records["board"].astype(np.int64), records["side"].astype(np.int64), labels
+
+
+# boards as seen by the side to move: its pits are 0-5 and its store is 6
+def _mover_view(boards, sides):
+    rotated = np.roll(boards, -7, axis=1)
+    return np.where((sides == 1)[:, None], rotated, boards)
+
+
+def _capture(b):
+    return ((b[:, 0:6] == 0) * b[:, 12 - _PIT_INDEX]).sum(axis=1)
+
+
+# features of eval_weighted, in WEIGHTED_DEFAULTS order
+def weighted_features(boards, sides):
+    b = _mover_view(boards, sides)
+    return np.stack([
+        b[:, 6] - b[:, 13],
+        b[:, 0:6].sum(axis=1) - b[:, 7:13].sum(axis=1),
+        _capture(b),
+        (b[:, 0:6] == _STORE_DISTANCE).sum(axis=1),
+    ], axis=1).astype(np.float64)
+
+
+# features of eval_positional, and the mask of positions it scores with them.
+# positional * sum((1 + idx * gradient) * diff) is split into the linear terms
+# positional * sum(diff) + (positional * gradient) * sum(idx * diff)
+def positional_features(boards, sides):
+    b = _mover_view(boards, sides)
+    diff = b[:, 0:6] - b[:, 7:13]
+    stores = b[:, 6] + b[:, 13]
+    # the late-game shortcut ignores the weights, those positions say nothing
+    mask = ~(stores > b.sum(axis=1) * 0.7)
+    X = np.stack([
+        b[:, 6] - b[:, 13],
+        diff.sum(axis=1),
+        (diff * _PIT_INDEX).sum(axis=1),
+        _capture(b),
+    ], axis=1).astype(np.float64)
+    return X[mask], mask
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -500, 500)))
+
+
+def logistic_loss(scores, labels):
+    p = np.clip(_sigmoid(scores), 1e-12, 1 - 1e-12)
+    return float(-np.mean(labels * np.log(p) + (1 - labels) * np.log(1 - p)))
+
+
+# scale K with the lowest loss for fixed weights, by golden-section search on log K
+def fit_scale(X, weights, labels, lo=1e-4, hi=1.0, iterations=60):
+    scores = X @ weights
+    a, b = np.log(lo), np.log(hi)
+    ratio = (np.sqrt(5) - 1) / 2
+    for _ in range(iterations):
+        c = b - ratio * (b - a)
+        d = a + ratio * (b - a)
+        if logistic_loss(np.exp(c) * scores, labels) < logistic_loss(np.exp(d) * scores, labels):
+            b = d
+        else:
+            a = c
+    return float(np.exp((a + b) / 2))
+
+
+# newton's method on the logistic loss of sigmoid(K * X @ w). a small ridge term
+# keeps the hessian invertible when a feature never varies in the data
+def fit_weights(X, labels, k, weights, iterations=25, ridge=1e-6, tol=1e-10):
+    w = np.array(weights, dtype=np.float64)
+    Xk = X * k
+    n = len(labels)
+    loss = logistic_loss(Xk @ w, labels)
+    for _ in range(iterations):
+        p = _sigmoid(Xk @ w)
+        grad = Xk.T @ (p - labels) / n + ridge * w
+        hess = (Xk * (p * (1 - p))[:, None]).T @ Xk / n + ridge * np.eye(len(w))
+        step = np.linalg.solve(hess, grad)
+        # halve the step until the loss goes down
+        t = 1.0
+        while t > 1e-6:
+            new_loss = logistic_loss(Xk @ (w - t * step), labels)
+            if new_loss <= loss:
+                break
+            t /= 2
+        w = w - t * step
+        if loss - new_loss < tol:
+            loss = new_loss
+            break
+        loss = new_loss
+    return w, loss
+
+
+def tune_weighted(boards, sides, labels):
+    X = weighted_features(boards, sides)
+    start = np.array(list(WEIGHTED_DEFAULTS.values()))
+    k = fit_scale(X, start, labels)
+    before = logistic_loss(k * X @ start, labels)
+    w, after = fit_weights(X, labels, k, start)
+    return dict(zip(WEIGHTED_DEFAULTS, w.tolist())), k, before, after, len(X)
+
+
+def tune_positional(boards, sides, labels):
+    X, mask = positional_features(boards, sides)
+    labels = labels[mask]
+    d = POSITIONAL_DEFAULTS
+    start = np.array([d["score_diff"], d["positional"], d["positional"] * d["gradient"], d["capture"]])
+    k = fit_scale(X, start, labels)
+    before = logistic_loss(k * X @ start, labels)
+    w, after = fit_weights(X, labels, k, start)
+    weights = {
+        "score_diff": float(w[0]),
+        "positional": float(w[1]),
+        "gradient": float(w[2] / w[1]) if w[1] else 0.0,
+        "capture": float(w[3]),
+    }
+    return weights, k, before, after, len(X)
+
+
+TUNERS = {
+    "weighted": tune_weighted,
+    "positional": tune_positional,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the Kalaha evaluation weights")
+    parser.add_argument("--data", default="selfplay", help="self-play directory from selfplay.py")
+    parser.add_argument("--eval", nargs="+", default=list(TUNERS), choices=list(TUNERS))
+    parser.add_argument("--max-positions", type=int, default=None)
+    parser.add_argument("--suffix", default="_tuned",
+                        help="tuned evaluators are registered as <eval><suffix>")
+    parser.add_argument("--out", default=DEFAULT_CONFIG_PATH)
+    args = parser.parse_args()
+    clashes = [name for name in args.eval if name + args.suffix in BUILTIN_EVAL_FUNCTIONS]
+    if clashes:
+        parser.error(f"--suffix {args.suffix!r} would name the tuned evaluators after "
+                     f"the built-in {', '.join(clashes)}")
+
+    start = time.time()
+    try:
+        boards, sides, labels = load_positions(args.data, args.max_positions)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    print(f"  loaded {len(labels)} positions in {time.time() - start:.1f}s")
+
+    settings = {}
+    settings_path = os.path.join(args.data, SETTINGS_FILE)
+    if os.path.exists(settings_path):
+        with open(settings_path) as f:
+            settings = json.load(f)
+
+    config = {}
+    if os.path.exists(args.out):
+        with open(args.out) as f:
+            config = json.load(f)
+    for name in args.eval:
+        t = time.time()
+        weights, k, before, after, n = TUNERS[name](boards, sides, labels)
+        print(f"  {name}: {n} positions, K={k:.4g}, loss {before:.4f} -> {after:.4f} "
+              f"({time.time() - t:.1f}s)")
+        for key, value in weights.items():
+            print(f"    {key:<12} {value:8.3f}")
+        config[name + args.suffix] = {
+            "base": name,
+            "weights": weights,
+            "scale": k,
+            "loss": after,
+            "positions": n,
+            "data": settings,
+        }
+
+    with open(args.out, "w") as f:
+        json.dump(config, f, indent=2)
+    print(f"  wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()